@@ -1,45 +1,615 @@
 import os
+import copy
 import json
+import asyncio
+import queue
+import random
+import secrets
+import threading
+import time
 #import openai  # <-- Add this import
-from openai import OpenAI
+from openai import APIConnectionError, APIStatusError
+from verdict_cache import VerdictCache, make_cache_key, make_variant_key
+from text_chunker import split_into_chunks, split_into_stable_chunks
+from rate_limiter import RateLimiter
+from token_budget import TokenBudget, TokenUsage, count_tokens, prompt_cache_tokens
+from instrumentation import telemetry
+from backend_pool import Backend, BackendPool
+from prompt_templates import get_template
+from revision_store import content_hash, paragraph_changes, paragraph_hashes
 
 
-class AIGeneratedAnalyzer:
+CONFIDENCE_RANK = {'High': 3, 'Medium': 2, 'Low': 1}
+
+
+def parse_line(line):
+    """Parse one response line into a ('score' | 'conclusion' | 'pattern', value) event, or None"""
+    line = line.strip()
+    if line.startswith('## AI Score:'):
+        return 'score', int(line.split(':')[-1].split('/')[0].strip())
+    elif line.startswith('## Conclusion:'):
+        return 'conclusion', line.split(':')[-1].strip()
+    elif line.startswith('-'):
+        parts = line.split(':', 1)
+        if len(parts) > 1:
+            pattern_name = parts[0][2:].strip()  # Remove leading '-'
+            description = parts[1].split('(Confidence:')[0].strip()
+            confidence = parts[1].split('Confidence:')[-1].replace(')', '').strip()
+            return 'pattern', {
+                'pattern': pattern_name,
+                'description': description,
+                'confidence': confidence
+            }
+    return None
+
+
+def parse_document_header(line):
+    """Document ID from a '### Document: [id]' section header of a packed reply, or None"""
+    line = line.strip()
+    if not line.startswith('### Document:'):
+        return None
+    return line.split(':', 1)[1].strip().strip('[]').strip() or None
+
+
+def _apply_event(analysis, event):
+    if event is None:
+        return
+    kind, value = event
+    if kind == 'pattern':
+        analysis['patterns'].append(value)
+    else:
+        analysis[kind] = value
+
+
+def analysis_events(analysis):
+    """Replay a finished analysis as the events a streamed reply would have produced"""
+    if analysis['score'] is not None:
+        yield 'score', analysis['score']
+    if analysis['conclusion'] is not None:
+        yield 'conclusion', analysis['conclusion']
+    for pattern in analysis['patterns']:
+        yield 'pattern', pattern
+
+
+class IncrementalResponseParser:
+    """Turns streamed completion deltas into parse events as soon as each line is complete"""
+
     def __init__(self):
+        self.analysis = {'score': None, 'conclusion': None, 'patterns': []}
+        self._buffer = ''
+
+    def feed(self, delta):
+        self._buffer += delta
+        events = []
+        while '\n' in self._buffer:
+            line, self._buffer = self._buffer.split('\n', 1)
+            event = parse_line(line)
+            if event is not None:
+                _apply_event(self.analysis, event)
+                events.append(event)
+        return events
+
+    def close(self):
+        line, self._buffer = self._buffer, ''
+        event = parse_line(line)
+        if event is None:
+            return []
+        _apply_event(self.analysis, event)
+        return [event]
+
+
+def merge_chunk_results(chunk_results):
+    """Reduce per-chunk analyses into one verdict, weighting scores by chunk length"""
+    scored = [c for c in chunk_results if c['analysis']['score'] is not None]
+    total_chars = sum(c['chars'] for c in scored)
+    score = round(sum(c['analysis']['score'] * c['chars'] for c in scored) / total_chars) if total_chars else None
+
+    # The chunk whose score is closest to the overall score best represents the whole document
+    conclusion = None
+    if scored:
+        representative = min(scored, key=lambda c: (abs(c['analysis']['score'] - score), -c['chars']))
+        conclusion = representative['analysis']['conclusion']
+
+    # De-duplicate patterns by name, keeping the most confident description
+    patterns = {}
+    for c in sorted(chunk_results, key=lambda c: c['index']):
+        for pattern in c['analysis']['patterns']:
+            key = pattern['pattern'].strip().lower()
+            merged = patterns.get(key)
+            if merged is None:
+                patterns[key] = dict(pattern, chunks=[c['index']])
+                continue
+            merged['chunks'].append(c['index'])
+            if CONFIDENCE_RANK.get(pattern['confidence'], 0) > CONFIDENCE_RANK.get(merged['confidence'], 0):
+                merged.update(description=pattern['description'], confidence=pattern['confidence'])
+
+    templates = sorted({c['analysis'].get('prompt_template') for c in chunk_results} - {None})
+
+    return {
+        'score': score,
+        'conclusion': conclusion,
+        # Chunks served from older cache entries may name an earlier template version
+        'prompt_template': ','.join(templates) or None,
+        'patterns': sorted(patterns.values(), key=lambda p: (-CONFIDENCE_RANK.get(p['confidence'], 0), -len(p['chunks']))),
+        'chunks': [
+            {'index': c['index'], 'chars': c['chars'], 'score': c['analysis']['score'], 'conclusion': c['analysis']['conclusion']}
+            for c in sorted(chunk_results, key=lambda c: c['index'])
+        ]
+    }
+
+
+class AsyncAIGeneratedAnalyzer:
+    def __init__(self, model="deepseek-chat", temperature=0.2, cache=None, api_key=None,
+                 base_url="https://api.deepseek.com", token_budget=None, max_concurrency=8,
+                 requests_per_minute=None, tokens_per_minute=None, max_retries=5,
+                 backoff_base=0.5, backoff_max=30.0, timeout=120.0, prescreen=None, prescreen_bands=None,
+                 near_duplicates=None, near_duplicate_mode='reuse', backends=None, packer=None,
+                 prompt_template='analyze', packed_prompt_template='analyze_packed', revisions=None):
         #openai.api_key = os.getenv('OPENAI_API_KEY')  # Set your OpenAI API key
-        self.client = OpenAI(api_key="YOUR_DEEPSEEK_KEY",base_url="https://api.deepseek.com")
-
-    def analyze_text(self, text):
-        prompt = f"""Analyze provided text for AI generation indicators. You are an expert AI-generated text analyzer. And you are given a text. MUST Provide following information:
-            1. AI Score (0-100)
-            2. Very Clear conclusion
-            3. Specific technical patterns with explanations
-            
-            Text: {text}
-            
-            Format response EXACTLY like:
-            ## AI Score: [score]/100
-            ## Conclusion: [conclusion in Chinese]
-            ## Patterns:
-            - [Pattern Name in Chinese]: [Description in Chinese] (Confidence: High/Medium/Low)
-            - [Pattern Name in Chinese]: [Description in Chinese] (Confidence: High/Medium/Low)
-            ..."""
-
-        # Call OpenAI ChatGPT API instead of AWS Bedrock
-        response = self.client.chat.completions.create(
-            model="deepseek-chat",  # or "gpt-4" if you have access
-            messages=[
-                {"role": "system", "content": "You are an expert AI-generated text analyzer."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=2048,
-            temperature=0.2
-        )
-        # Extract the generated content
-        result = response.choices[0].message.content
-        return self._parse_response(result)
+        # One pooled HTTP client per endpoint; retries are handled below. A bare base_url/model is a
+        # single-backend pool, while a BackendPool of several endpoints adds hedging and circuit breaking
+        self.backends = backends or BackendPool([Backend(base_url, model, api_key=api_key, timeout=timeout)])
+        self.client = self.backends.client
+        self.model = self.backends.model
+        self.temperature = temperature
+        # Deployment-wide budget by default; with_options(token_budget=...) overrides it per call
+        self.token_budget = token_budget or TokenBudget.from_env()
+        self.usage = TokenUsage()
+        # cache=None uses the default on-disk verdict cache, cache=False disables caching
+        self.cache = VerdictCache() if cache is None else (cache or None)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Optional StylometricPrescreen: clear-cut inputs get a local verdict without a model call
+        self.prescreen = prescreen
+        # (human_below, ai_above) for this caller; None keeps the pre-screen's own bands
+        self.prescreen_bands = prescreen_bands
+        # Optional NearDuplicateIndex: 'reuse' returns an earlier verdict, 'flag' still calls the model
+        self.near_duplicates = near_duplicates
+        self.near_duplicate_mode = near_duplicate_mode
+        # Optional RequestPacker: concurrent short documents share one multi-document completion
+        self.packer = packer
+        # Registered PromptTemplates (or their names / 'name@vN' ids); the latest version unless pinned
+        self.prompt_template = get_template(prompt_template)
+        self.packed_prompt_template = get_template(packed_prompt_template)
+        # Optional RevisionStore: resubmissions under the same document ID only re-score edited sections
+        self.revisions = revisions
+
+    def _messages(self, text):
+        return self.prompt_template.messages(text=text)
+
+    def _packed_messages(self, documents):
+        # Random IDs cannot collide with delimiter-like lines inside a submitted text
+        blocks = [f"<<<DOC {document_id}>>>\n{text}\n<<<END {document_id}>>>" for document_id, text in documents]
+        return self.packed_prompt_template.messages(count=len(blocks), documents='\n\n'.join(blocks))
+
+    def _lookup(self, text, bypass_cache):
+        """Return (verdict, None) when no model call is needed, else (None, state for _store)"""
+        pending = {'cache_key': None, 'signature': None, 'variant': None, 'near_duplicate': None}
+        if self.cache is not None:
+            pending['cache_key'] = make_cache_key(text, self.model, self.prompt_template.fingerprint, self.temperature)
+            # bypass skips the lookup but still refreshes the stored verdict
+            if not bypass_cache:
+                cached = self.cache.get(pending['cache_key'])
+                if cached is not None:
+                    telemetry.note_lookup('hit')
+                    return cached, None
+
+        if self.near_duplicates is not None:
+            pending['signature'] = self.near_duplicates.signature(text)
+            # Like the exact-match key, a near-duplicate only reuses verdicts from the same model, prompt and temperature
+            pending['variant'] = make_variant_key(self.model, self.prompt_template.fingerprint, self.temperature)
+            match = None if bypass_cache else self.near_duplicates.query(text, signature=pending['signature'], variant=pending['variant'])
+            if match is not None:
+                pending['near_duplicate'] = {'match_id': match['match_id'], 'similarity': round(match['similarity'], 3)}
+                if self.near_duplicate_mode == 'reuse':
+                    telemetry.note_lookup('near_duplicate')
+                    return dict(match['verdict'], near_duplicate=pending['near_duplicate']), None
+
+        if self.prescreen is not None:
+            local = self.prescreen.screen(text, *(self.prescreen_bands or ()))
+            if local is not None:
+                telemetry.note_lookup('prescreen')
+                return local, None
+        telemetry.note_lookup('bypass' if bypass_cache else 'miss')
+        return None, pending
+
+    def _retarget(self, text, pending, template):
+        """pending with its cache and near-duplicate keys for verdicts produced by another prompt template"""
+        pending = dict(pending)
+        if pending['cache_key'] is not None:
+            pending['cache_key'] = make_cache_key(text, self.model, template.fingerprint, self.temperature)
+        if pending['variant'] is not None:
+            pending['variant'] = make_variant_key(self.model, template.fingerprint, self.temperature)
+        return pending
+
+    def _pack_group(self):
+        # with_options clones share one packer; only requests that would be sent identically may share a pack
+        return (id(self.backends), self.model, self.temperature, self.prompt_template.id, self.packed_prompt_template.id)
+
+    def _store(self, text, analysis, pending):
+        # A packed reply comes from a different prompt, so it must not land under the single-document keys
+        if analysis.get('prompt_template') == self.packed_prompt_template.id != self.prompt_template.id:
+            pending = self._retarget(text, pending, self.packed_prompt_template)
+        # Only cache complete verdicts so a malformed reply is retried next time
+        if analysis['score'] is not None:
+            if pending['cache_key'] is not None:
+                self.cache.set(pending['cache_key'], analysis)
+            if self.near_duplicates is not None:
+                self.near_duplicates.add(text, analysis, signature=pending['signature'], variant=pending['variant'])
+        if pending['near_duplicate'] is not None:
+            analysis = dict(analysis, near_duplicate=pending['near_duplicate'])
+        return analysis
+
+    async def analyze_text(self, text, bypass_cache=False):
+        with telemetry.request(chars=len(text)):
+            text, analysis, pending = self._prepare(text, bypass_cache)
+            if analysis is not None:
+                return analysis
+            if self.packer is not None:
+                prompt_tokens = count_tokens(text)
+                if self.packer.accepts(prompt_tokens):
+                    packed_key = self._retarget(text, pending, self.packed_prompt_template)['cache_key']
+                    cached = None if packed_key is None or bypass_cache else self.cache.get(packed_key)
+                    if cached is not None:
+                        telemetry.note_lookup('hit')
+                        return cached if pending['near_duplicate'] is None else dict(cached, near_duplicate=pending['near_duplicate'])
+                    with telemetry.span('pack_wait'):
+                        analysis, pack_size = await self.packer.submit(text, prompt_tokens, self.token_budget.output_tokens(), self._send_pack,
+                                                                       group=self._pack_group())
+                    telemetry.annotate(packed=pack_size)
+                    return self._store(text, analysis, pending)
+            with telemetry.span('prompt', prompt_template=self.prompt_template.id):
+                messages = self._messages(text)
+            result = await self._complete(messages)
+            with telemetry.span('parse'):
+                analysis = self._parse_response(result)
+            analysis['prompt_template'] = self.prompt_template.id
+            return self._store(text, analysis, pending)
+
+    def _prepare(self, text, bypass_cache):
+        with telemetry.span('budget'):
+            text = self.token_budget.fit_text(text)
+        telemetry.accumulate(prompt_chars=len(text))
+        with telemetry.span('lookup'):
+            analysis, pending = self._lookup(text, bypass_cache)
+        return text, analysis, pending
+
+    async def analyze_text_stream(self, text, bypass_cache=False):
+        """Yield ('score' | 'conclusion' | 'pattern', value) events as the reply streams in, then ('done', analysis)"""
+        with telemetry.request(chars=len(text)):
+            text, analysis, pending = self._prepare(text, bypass_cache)
+            if analysis is not None:
+                for event in analysis_events(analysis):
+                    yield event
+            else:
+                with telemetry.span('prompt', prompt_template=self.prompt_template.id):
+                    messages = self._messages(text)
+                parser = IncrementalResponseParser()
+                async for delta in self._complete_stream(messages):
+                    for event in parser.feed(delta):
+                        yield event
+                for event in parser.close():
+                    yield event
+                parser.analysis['prompt_template'] = self.prompt_template.id
+                analysis = self._store(text, parser.analysis, pending)
+            yield 'done', analysis
+
+    async def _send_pack(self, items, max_tokens):
+        """Score a pack in one completion; documents missing from the reply fall back to their own calls"""
+        with telemetry.request(source='pack', documents=len(items)) as record:
+            ids = set()
+            while len(ids) < len(items):
+                ids.add(secrets.token_hex(3))
+            ids = list(ids)
+            analyses = {}
+            if len(items) > 1:
+                completion_tokens = 0
+                try:
+                    with telemetry.span('prompt', prompt_template=self.packed_prompt_template.id):
+                        messages = self._packed_messages([(document_id, item['text']) for document_id, item in zip(ids, items)])
+                    result = await self._complete(messages, max_tokens=max_tokens)
+                    completion_tokens = count_tokens(result)
+                    with telemetry.span('parse'):
+                        analyses = self._parse_response(result, document_ids=ids)
+                    for analysis in analyses.values():
+                        analysis['prompt_template'] = self.packed_prompt_template.id
+                except Exception as e:
+                    # e.g. a pack the provider rejects as too long; each document still gets its own attempt
+                    telemetry.annotate(pack_error=type(e).__name__)
+                fallbacks = [item for document_id, item in zip(ids, items) if document_id not in analyses]
+                # The api stage excludes rate-limit and concurrency-slot waits, so the learned decode rate reflects
+                # the provider alone and packs do not shrink just because requests queue locally
+                self.packer.observe(len(items), completion_tokens, record['stages'].get('api', 0), len(fallbacks))
+                telemetry.annotate(fallbacks=len(fallbacks))
+
+            for document_id, item in zip(ids, items):
+                if document_id in analyses and not item['future'].done():
+                    item['future'].set_result((analyses[document_id], len(items)))
+            await asyncio.gather(*(self._send_single(item) for document_id, item in zip(ids, items) if document_id not in analyses))
+
+    async def _send_single(self, item):
+        try:
+            result = await self._complete(self._messages(item['text']), max_tokens=item['output_tokens'])
+            analysis = self._parse_response(result)
+            analysis['prompt_template'] = self.prompt_template.id
+        except Exception as e:
+            if not item['future'].done():
+                item['future'].set_exception(e)
+            return
+        if not item['future'].done():
+            item['future'].set_result((analysis, 1))
+
+    def _retryable(self, error):
+        status = getattr(error, 'status_code', None)
+        return status is None or status == 429 or status >= 500
+
+    async def _complete(self, messages, max_tokens=None):
+        # Budget the prompt plus the worst-case completion against tokens-per-minute
+        prompt_tokens = sum(count_tokens(m['content']) for m in messages)
+        max_tokens = max_tokens or self.token_budget.output_tokens()
+        expected_tokens = prompt_tokens + max_tokens
+        attempt = 0
+        while True:
+            with telemetry.span('rate_limit'):
+                await self.rate_limiter.acquire(expected_tokens)
+            # Waiting for a concurrency slot is local queueing, timed apart from the provider's own latency
+            with telemetry.span('queue'):
+                await self.semaphore.acquire()
+            try:
+                try:
+                    with telemetry.span('api'):
+                        # Call OpenAI ChatGPT API instead of AWS Bedrock
+                        response, backend = await self.backends.create(
+                            messages=messages,
+                            max_tokens=max_tokens,
+                            temperature=self.temperature
+                        )
+                finally:
+                    self.semaphore.release()
+                telemetry.annotate(backend=backend.name)
+                self._record_usage(prompt_tokens, max_tokens, getattr(response, 'usage', None))
+                # Extract the generated content
+                return response.choices[0].message.content
+            except (APIStatusError, APIConnectionError) as e:
+                if not self._retryable(e) or attempt >= self.max_retries:
+                    raise
+                self._record_retry(e)
+                await asyncio.sleep(self._backoff_delay(attempt, e))
+                attempt += 1
+
+    async def _complete_stream(self, messages):
+        prompt_tokens = sum(count_tokens(m['content']) for m in messages)
+        max_tokens = self.token_budget.output_tokens()
+        expected_tokens = prompt_tokens + max_tokens
+        attempt = 0
+        while True:
+            with telemetry.span('rate_limit'):
+                await self.rate_limiter.acquire(expected_tokens)
+            received = False
+            # A stream cannot be hedged once it starts yielding, so it only gets routing and circuit breaking
+            backend = self.backends.pick()
+            with telemetry.span('queue'):
+                await self.semaphore.acquire()
+            try:
+                try:
+                    with telemetry.span('api', backend=backend.name, stream=True):
+                        started = time.perf_counter()
+                        stream = await backend.client.chat.completions.create(
+                            model=backend.model,
+                            messages=messages,
+                            max_tokens=max_tokens,
+                            temperature=self.temperature,
+                            stream=True,
+                            stream_options={"include_usage": True}
+                        )
+                        usage = None
+                        async for chunk in stream:
+                            # The final chunk carries usage and no choices
+                            if getattr(chunk, 'usage', None) is not None:
+                                usage = chunk.usage
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                if not received:
+                                    first_token = time.perf_counter() - started
+                                    telemetry.first_token_seconds.observe(first_token, prompt_template=self.prompt_template.id)
+                                    telemetry.annotate(first_token_seconds=round(first_token, 6))
+                                received = True
+                                yield chunk.choices[0].delta.content
+                finally:
+                    self.semaphore.release()
+                backend.record_success()
+                self._record_usage(prompt_tokens, max_tokens, usage)
+                return
+            except (APIStatusError, APIConnectionError) as e:
+                backend.record_failure(e)
+                # A reply that has started streaming cannot be replayed, so only retry before the first token
+                if received or not self._retryable(e) or attempt >= self.max_retries:
+                    raise
+                self._record_retry(e)
+                await asyncio.sleep(self._backoff_delay(attempt, e))
+                attempt += 1
+
+    def _record_usage(self, estimated_prompt_tokens, max_tokens, usage):
+        self.usage.record(estimated_prompt_tokens, max_tokens, usage)
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+        telemetry.tokens.inc(prompt_tokens, kind='prompt')
+        telemetry.tokens.inc(completion_tokens, kind='completion')
+        telemetry.accumulate(api_calls=1, estimated_prompt_tokens=estimated_prompt_tokens,
+                             prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        hit, miss = prompt_cache_tokens(usage)
+        if hit is not None:
+            telemetry.tokens.inc(hit, kind='prompt_cache_hit')
+            telemetry.tokens.inc(miss, kind='prompt_cache_miss')
+            telemetry.accumulate(prompt_cache_hit_tokens=hit, prompt_cache_miss_tokens=miss)
+
+    def _record_retry(self, error):
+        reason = getattr(error, 'status_code', None) or 'connection'
+        telemetry.retries.inc(reason=reason)
+        telemetry.accumulate(retries=1)
+
+    def _backoff_delay(self, attempt, error):
+        # Full-jitter exponential backoff, never sooner than the server's Retry-After hint
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        try:
+            delay = max(delay, min(self.backoff_max, float(retry_after)))
+        except (TypeError, ValueError):
+            pass
+        return delay
+
+    async def analyze_many(self, texts, bypass_cache=False, return_exceptions=False):
+        """Yield (index, analysis) pairs as each text finishes, in completion order"""
+        async def run(index, text):
+            try:
+                return index, await self.analyze_text(text, bypass_cache=bypass_cache)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                return index, e
+
+        tasks = [asyncio.ensure_future(run(index, text)) for index, text in enumerate(texts)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _chunked_events(self, text, max_chunk_tokens, bypass_cache):
+        """Yield ('chunk', chunk_result, done, total) as chunks finish, then ('done', merged analysis)"""
+        # One request record for the whole document; the per-chunk tasks report into it
+        with telemetry.request(chars=len(text)):
+            chunks = split_into_chunks(text, max_tokens=max_chunk_tokens)
+            if len(chunks) <= 1:
+                result = await self.analyze_text(text, bypass_cache=bypass_cache)
+            else:
+                telemetry.annotate(chunks=len(chunks))
+                chunk_results = []
+                async for index, analysis in self.analyze_many(chunks, bypass_cache=bypass_cache):
+                    chunk_result = {'index': index, 'chars': len(chunks[index]), 'analysis': analysis}
+                    chunk_results.append(chunk_result)
+                    yield 'chunk', chunk_result, len(chunk_results), len(chunks)
+                result = merge_chunk_results(chunk_results)
+        yield 'done', result
+
+    async def analyze_chunked(self, text, max_chunk_tokens=1500, bypass_cache=False, on_chunk=None):
+        """Map-reduce analysis for long documents: score token-bounded chunks concurrently, then merge"""
+        return await _consume_events(self._chunked_events(text, max_chunk_tokens, bypass_cache), on_chunk)
+
+    def _revision_variant(self):
+        # Verdicts only carry over while the model, prompt and sampling that produced them are unchanged
+        return f"{self.model}|{self.prompt_template.id}|{self.temperature}"
+
+    def _previous_revision(self, document_id):
+        previous = None if self.revisions is None else self.revisions.get(document_id)
+        return previous if previous is not None and previous['variant'] == self._revision_variant() else None
+
+    def has_revision(self, document_id):
+        """Whether a resubmission of document_id can reuse section verdicts from its last revision"""
+        return self._previous_revision(document_id) is not None
+
+    def _plan_revision(self, text, document_id, max_chunk_tokens, bypass_cache):
+        """Split text into stable sections and reuse the verdicts of sections unchanged since the last revision"""
+        chunks = split_into_stable_chunks(text, max_tokens=max_chunk_tokens)
+        previous = self._previous_revision(document_id)
+        plan = {'chunks': chunks, 'keys': [content_hash(chunk) for chunk in chunks], 'variant': self._revision_variant(),
+                'previous': previous, 'reused': [], 'fresh': []}
+        for index, key in enumerate(plan['keys']):
+            # bypass re-scores every section but still records this revision
+            analysis = None if previous is None or bypass_cache else previous['sections'].get(key)
+            if analysis is None:
+                plan['fresh'].append(index)
+            else:
+                plan['reused'].append({'index': index, 'chars': len(chunks[index]), 'analysis': analysis})
+        return plan
+
+    def _finish_revision(self, text, document_id, plan, chunk_results):
+        paragraphs = paragraph_hashes(text)
+        previous = plan['previous']
+        if self.revisions is not None:
+            # Only scored sections are kept, so a malformed reply is retried on the next resubmission
+            sections = {plan['keys'][c['index']]: c['analysis'] for c in chunk_results if c['analysis']['score'] is not None}
+            self.revisions.put(document_id, {'variant': plan['variant'], 'paragraphs': paragraphs, 'sections': sections})
+            self.revisions.record(len(plan['reused']), len(plan['fresh']))
+        changes = paragraph_changes(previous['paragraphs'] if previous is not None else [], paragraphs)
+        result = merge_chunk_results(chunk_results)
+        result['revision'] = {
+            'document_id': document_id,
+            'sections': len(plan['chunks']),
+            'sections_reanalyzed': len(plan['fresh']),
+            'paragraphs': len(paragraphs),
+            'paragraphs_added': changes['added'],
+            'paragraphs_edited': changes['edited'],
+            'paragraphs_removed': changes['removed']
+        }
+        telemetry.annotate(chunks=len(plan['chunks']), sections_reanalyzed=len(plan['fresh']))
+        return result
+
+    async def _revision_events(self, text, document_id, max_chunk_tokens, bypass_cache):
+        """Like _chunked_events, over stable sections with unchanged ones taken from the last revision"""
+        # A first submission that fits one request is scored whole; sections only pay off once there is history
+        if not self.has_revision(document_id) and len(split_into_chunks(text, max_tokens=max_chunk_tokens)) <= 1:
+            async for event in self._chunked_events(text, max_chunk_tokens, bypass_cache):
+                yield event
+            return
+        with telemetry.request(chars=len(text), document_id=document_id):
+            plan = self._plan_revision(text, document_id, max_chunk_tokens, bypass_cache)
+            chunk_results = []
+            for chunk_result in plan['reused']:
+                chunk_results.append(chunk_result)
+                yield 'chunk', chunk_result, len(chunk_results), len(plan['chunks'])
+            fresh = [plan['chunks'][index] for index in plan['fresh']]
+            async for position, analysis in self.analyze_many(fresh, bypass_cache=bypass_cache):
+                index = plan['fresh'][position]
+                chunk_result = {'index': index, 'chars': len(plan['chunks'][index]), 'analysis': analysis}
+                chunk_results.append(chunk_result)
+                yield 'chunk', chunk_result, len(chunk_results), len(plan['chunks'])
+            result = self._finish_revision(text, document_id, plan, chunk_results)
+        yield 'done', result
+
+    async def analyze_revision(self, text, document_id, max_chunk_tokens=1500, bypass_cache=False, on_chunk=None):
+        """Incremental analysis of an edited resubmission: re-score only sections changed since document_id's last revision"""
+        return await _consume_events(self._revision_events(text, document_id, max_chunk_tokens, bypass_cache), on_chunk)
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache is not None else None
+
+    def prescreen_stats(self):
+        return self.prescreen.stats() if self.prescreen is not None else None
+
+    def revision_stats(self):
+        return self.revisions.stats() if self.revisions is not None else None
+
+    def usage_stats(self):
+        return self.usage.stats()
+
+    def backend_stats(self):
+        return self.backends.stats()
+
+    def packer_stats(self):
+        return self.packer.stats() if self.packer is not None else None
+
+    def with_options(self, **overrides):
+        """Shallow copy with per-caller settings that still shares the client pool, limits and caches"""
+        clone = copy.copy(self)
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise AttributeError(f"Unknown analyzer option: {name}")
+            setattr(clone, name, value)
+        return clone
+
+    async def aclose(self):
+        await self.backends.aclose()
+
+    def _parse_response(self, result, document_ids=None):
+        """Parse a reply into an analysis, or a packed reply into {document_id: analysis}"""
+        if document_ids is not None:
+            return self._parse_packed_response(result, document_ids)
 
-    def _parse_response(self, result):
         analysis = {
             'score': None,
             'conclusion': None,
@@ -48,21 +618,170 @@ class AIGeneratedAnalyzer:
 
         # parse the response => create analysis report in dictionary format 
         for line in result.split('\n'):
-            line = line.strip()
-            if line.startswith('## AI Score:'):
-                analysis['score'] = int(line.split(':')[-1].split('/')[0].strip())
-            elif line.startswith('## Conclusion:'):
-                analysis['conclusion'] = line.split(':')[-1].strip()
-            elif line.startswith('-'):
-                parts = line.split(':', 1)
-                if len(parts) > 1:
-                    pattern_name = parts[0][2:].strip()  # Remove leading '-'
-                    description = parts[1].split('(Confidence:')[0].strip()
-                    confidence = parts[1].split('Confidence:')[-1].replace(')', '').strip()
-                    analysis['patterns'].append({
-                        'pattern': pattern_name,
-                        'description': description,
-                        'confidence': confidence
-                    })
+            _apply_event(analysis, parse_line(line))
 
         return analysis
+
+    def _parse_packed_response(self, result, document_ids):
+        # Demultiplex by section header. Unknown, repeated or malformed sections are dropped, and
+        # only sections with a score and conclusion count, so a truncated tail falls back cleanly
+        expected = set(document_ids)
+        sections = {}
+        broken = set()
+        current = None
+        for line in result.split('\n'):
+            document_id = parse_document_header(line)
+            if document_id is not None:
+                if document_id in expected and document_id not in sections:
+                    current = document_id
+                    sections[current] = {'score': None, 'conclusion': None, 'patterns': []}
+                else:
+                    broken.add(document_id)
+                    current = None
+                continue
+            if current is None:
+                continue
+            try:
+                _apply_event(sections[current], parse_line(line))
+            except ValueError:
+                broken.add(current)
+        return {
+            document_id: analysis for document_id, analysis in sections.items()
+            if document_id not in broken and analysis['score'] is not None and analysis['conclusion'] is not None
+        }
+
+
+async def _consume_events(events, on_chunk):
+    # Drain a ('chunk', ...) / ('done', result) event stream, passing chunk progress to on_chunk
+    result = None
+    async for kind, *payload in events:
+        if kind == 'done':
+            result = payload[0]
+        elif on_chunk is not None:
+            on_chunk(*payload)
+    return result
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop():
+    # A single long-lived event loop thread lets sync callers share pooled async connections
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="analyzer-event-loop", daemon=True).start()
+        return _loop
+
+
+class AIGeneratedAnalyzer:
+    """Blocking facade over AsyncAIGeneratedAnalyzer, safe to call from any thread"""
+
+    def __init__(self, model="deepseek-chat", temperature=0.2, cache=None, async_analyzer=None, **kwargs):
+        self.async_analyzer = async_analyzer or AsyncAIGeneratedAnalyzer(model=model, temperature=temperature, cache=cache, **kwargs)
+
+    @property
+    def client(self):
+        return self.async_analyzer.client
+
+    @property
+    def model(self):
+        return self.async_analyzer.model
+
+    @property
+    def cache(self):
+        return self.async_analyzer.cache
+
+    @property
+    def prompt_template(self):
+        return self.async_analyzer.prompt_template
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
+
+    def analyze_text(self, text, bypass_cache=False):
+        return self._run(self.async_analyzer.analyze_text(text, bypass_cache=bypass_cache))
+
+    def _iterate(self, agen):
+        # Drive an async generator on the background loop and hand its items to this thread as they arrive
+        items = queue.Queue()
+
+        async def produce():
+            error = None
+            try:
+                async for item in agen:
+                    items.put((False, item))
+            except Exception as e:
+                error = e
+            finally:
+                items.put((True, error))
+
+        future = asyncio.run_coroutine_threadsafe(produce(), _background_loop())
+        try:
+            while True:
+                finished, item = items.get()
+                if finished:
+                    if item is not None:
+                        raise item
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    def analyze_many(self, texts, bypass_cache=False, return_exceptions=False):
+        """Yield (index, analysis) pairs as each text finishes, in completion order"""
+        yield from self._iterate(self.async_analyzer.analyze_many(texts, bypass_cache=bypass_cache, return_exceptions=return_exceptions))
+
+    def analyze_text_stream(self, text, bypass_cache=False):
+        """Yield parse events as the reply streams in, ending with ('done', analysis)"""
+        yield from self._iterate(self.async_analyzer.analyze_text_stream(text, bypass_cache=bypass_cache))
+
+    def _consume_events(self, events, on_chunk):
+        # Callbacks run on the calling thread so Streamlit elements can be updated from them
+        result = None
+        for kind, *payload in self._iterate(events):
+            if kind == 'done':
+                result = payload[0]
+            elif on_chunk is not None:
+                on_chunk(*payload)
+        return result
+
+    def analyze_chunked(self, text, max_chunk_tokens=1500, bypass_cache=False, on_chunk=None):
+        """Map-reduce analysis for long documents: score token-bounded chunks concurrently, then merge"""
+        return self._consume_events(self.async_analyzer._chunked_events(text, max_chunk_tokens, bypass_cache), on_chunk)
+
+    def has_revision(self, document_id):
+        return self.async_analyzer.has_revision(document_id)
+
+    def analyze_revision(self, text, document_id, max_chunk_tokens=1500, bypass_cache=False, on_chunk=None):
+        """Incremental analysis of an edited resubmission: re-score only sections changed since document_id's last revision"""
+        return self._consume_events(self.async_analyzer._revision_events(text, document_id, max_chunk_tokens, bypass_cache), on_chunk)
+
+    def with_options(self, **overrides):
+        return AIGeneratedAnalyzer(async_analyzer=self.async_analyzer.with_options(**overrides))
+
+    def cache_stats(self):
+        return self.async_analyzer.cache_stats()
+
+    def prescreen_stats(self):
+        return self.async_analyzer.prescreen_stats()
+
+    def revision_stats(self):
+        return self.async_analyzer.revision_stats()
+
+    def usage_stats(self):
+        return self.async_analyzer.usage_stats()
+
+    def backend_stats(self):
+        return self.async_analyzer.backend_stats()
+
+    def packer_stats(self):
+        return self.async_analyzer.packer_stats()
+
+    def _parse_response(self, result):
+        return self.async_analyzer._parse_response(result)
+
+    def close(self):
+        self._run(self.async_analyzer.aclose())
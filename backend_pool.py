@@ -0,0 +1,280 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+import numpy as np
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError
+from instrumentation import telemetry
+
+
+def counts_against_backend(error):
+    # Throttling, server errors and dropped connections say something about the endpoint; 4xx request errors do not
+    status = getattr(error, 'status_code', None)
+    return status is None or status == 429 or status >= 500
+
+
+class CircuitBreaker:
+    """Stops routing to an endpoint whose recent error rate spikes, probing again after a cooldown"""
+
+    def __init__(self, window=20, failure_rate=0.5, min_requests=5, cooldown=30.0):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = None
+        # When the current half-open trial request started; a trial that never reports expires after cooldown
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return 'open'
+        return 'half_open'
+
+    def _probe_free(self):
+        return self._probe_started is None or time.monotonic() - self._probe_started >= self.cooldown
+
+    def available(self):
+        with self._lock:
+            state = self._state()
+            return state == 'closed' or (state == 'half_open' and self._probe_free())
+
+    def acquire(self):
+        """Claim a request slot; in half-open state only a single trial request gets one"""
+        with self._lock:
+            state = self._state()
+            if state == 'half_open' and self._probe_free():
+                self._probe_started = time.monotonic()
+                return True
+            return state == 'closed'
+
+    def retry_at(self):
+        with self._lock:
+            return 0.0 if self._opened_at is None else self._opened_at + self.cooldown
+
+    def record(self, success):
+        with self._lock:
+            if self._opened_at is not None:
+                if self._probe_started is not None:
+                    self._probe_started = None
+                    if success:
+                        self._opened_at = None
+                        self._outcomes.clear()
+                    else:
+                        self._opened_at = time.monotonic()
+                return
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_requests and failures / len(self._outcomes) >= self.failure_rate:
+                self._opened_at = time.monotonic()
+
+
+class Backend:
+    """One OpenAI-compatible endpoint and model, with its own connection pool, latency history and breaker"""
+
+    def __init__(self, base_url, model, api_key=None, weight=1.0, name=None, timeout=120.0, breaker=None, latency_window=200):
+        self.base_url = base_url
+        self.model = model
+        self.weight = weight
+        self.name = name or f"{model}@{base_url}"
+        self.client = AsyncOpenAI(
+            api_key=api_key or os.getenv('DEEPSEEK_API_KEY', "YOUR_DEEPSEEK_KEY"),
+            base_url=base_url,
+            max_retries=0,
+            timeout=timeout
+        )
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = deque(maxlen=latency_window)
+        self.requests = 0
+        self.errors = 0
+
+    def latency_percentile(self, percentile, min_samples):
+        if len(self.latencies) < min_samples:
+            return None
+        return float(np.percentile(self.latencies, percentile))
+
+    def record_success(self, latency=None):
+        self.requests += 1
+        if latency is not None:
+            self.latencies.append(latency)
+        self.breaker.record(True)
+        telemetry.backend_requests.inc(backend=self.name, outcome='ok')
+
+    def record_failure(self, error):
+        self.requests += 1
+        if counts_against_backend(error):
+            self.errors += 1
+            self.breaker.record(False)
+        telemetry.backend_requests.inc(backend=self.name, outcome='error')
+
+    async def complete(self, **kwargs):
+        # An abandoned hedge is cancelled without being recorded: its cut-off time is shorter than the call would have
+        # taken, and keeping it would drag the hedge percentile down until nearly every call is hedged
+        started = time.perf_counter()
+        try:
+            response = await self.client.chat.completions.create(model=self.model, **kwargs)
+        except (APIStatusError, APIConnectionError) as e:
+            self.record_failure(e)
+            raise
+        self.record_success(time.perf_counter() - started)
+        return response
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'weight': self.weight,
+            'requests': self.requests,
+            'errors': self.errors,
+            'breaker': self.breaker.state,
+            'p50': self.latency_percentile(50, 1),
+            'p95': self.latency_percentile(95, 1)
+        }
+
+
+class BackendPool:
+    """Weighted routing over several backends with hedged requests and per-backend circuit breaking
+
+    A request that outlives the primary backend's learned hedge_percentile latency is duplicated to a
+    second backend and the first reply wins. Hedges draw on a budget refilled by max_hedge_ratio per
+    request, so extra spend stays bounded even when every backend slows down together.
+    """
+
+    def __init__(self, backends, hedge_percentile=95, min_samples=20, min_hedge_delay=0.05,
+                 max_hedge_ratio=0.1, hedge_burst=5.0, seed=None):
+        if not backends:
+            raise ValueError("BackendPool needs at least one backend")
+        self.backends = list(backends)
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_ratio = max_hedge_ratio
+        self.hedge_burst = hedge_burst
+        self._hedge_credit = hedge_burst
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_config(cls, entries, **kwargs):
+        """Build from [{'base_url', 'model', 'api_key' | 'api_key_env', 'weight', 'name'}, ...]"""
+        backends = []
+        for entry in entries:
+            entry = dict(entry)
+            api_key_env = entry.pop('api_key_env', None)
+            if api_key_env:
+                entry['api_key'] = os.getenv(api_key_env)
+            backends.append(Backend(**entry))
+        return cls(backends, **kwargs)
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Pool described by ANALYZER_BACKENDS (a JSON list, or a path to a JSON file), else None"""
+        value = os.getenv('ANALYZER_BACKENDS')
+        if not value:
+            return None
+        if not value.lstrip().startswith('['):
+            with open(value, encoding='utf-8') as f:
+                value = f.read()
+        return cls.from_config(json.loads(value), **kwargs)
+
+    @property
+    def model(self):
+        # Identifies the pool in verdict cache keys; a single-model pool keys like that model alone
+        return '+'.join(sorted({backend.model for backend in self.backends}))
+
+    @property
+    def client(self):
+        return self.backends[0].client
+
+    def pick(self, exclude=()):
+        """Weighted random choice among backends whose breaker allows traffic"""
+        candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+        allowed = [b for b in candidates if b.breaker.available()]
+        if not allowed:
+            if exclude:
+                return None
+            # Every breaker is open: try the one that tripped longest ago rather than failing outright
+            return min(candidates, key=lambda b: b.breaker.retry_at())
+        with self._lock:
+            chosen = self._rng.choices(allowed, weights=[b.weight for b in allowed])[0]
+        chosen.breaker.acquire()
+        return chosen
+
+    def _take_hedge_credit(self):
+        with self._lock:
+            if self._hedge_credit < 1:
+                return False
+            self._hedge_credit -= 1
+            self.hedges += 1
+            return True
+
+    async def create(self, **kwargs):
+        """chat.completions.create on the pool; returns (response, backend that answered)"""
+        with self._lock:
+            self.requests += 1
+            self._hedge_credit = min(self.hedge_burst, self._hedge_credit + self.max_hedge_ratio)
+
+        primary = self.pick()
+        first = asyncio.ensure_future(primary.complete(**kwargs))
+        delay = primary.latency_percentile(self.hedge_percentile, self.min_samples) if len(self.backends) > 1 else None
+        if delay is None:
+            return await first, primary
+
+        try:
+            done, _ = await asyncio.wait({first}, timeout=max(self.min_hedge_delay, delay))
+            if done:
+                return first.result(), primary
+            secondary = self.pick(exclude=(primary,))
+            if secondary is None or not self._take_hedge_credit():
+                return await first, primary
+        except BaseException:
+            first.cancel()
+            raise
+
+        second = asyncio.ensure_future(secondary.complete(**kwargs))
+        owners = {first: primary, second: secondary}
+        pending = set(owners)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = owners[task]
+                        if winner is secondary:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        telemetry.hedges.inc(result='won' if winner is secondary else 'lost')
+                        return task.result(), winner
+                    error = error or task.exception()
+            # Both attempts failed; the caller's retry loop decides what happens next
+            raise error
+        finally:
+            # The slower duplicate is abandoned, not counted against its backend
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        with self._lock:
+            summary = {'requests': self.requests, 'hedges': self.hedges, 'hedge_wins': self.hedge_wins,
+                       'hedge_rate': self.hedges / self.requests if self.requests else 0.0}
+        summary['backends'] = [backend.stats() for backend in self.backends]
+        return summary
+
+    async def aclose(self):
+        for backend in self.backends:
+            await backend.client.close()
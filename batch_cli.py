@@ -0,0 +1,235 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from ai_generated_analyzer import AsyncAIGeneratedAnalyzer
+from stylometry import StylometricPrescreen
+from token_budget import TokenBudget
+from text_extraction import MIME_TYPES, POOL_CONTEXT, extract_document, mime_type_for_path
+from extraction_cache import ExtractionCache, content_key
+from instrumentation import telemetry
+from backend_pool import BackendPool
+from request_packer import RequestPacker
+
+MIN_CHARS = 200
+
+
+def discover_files(targets, recursive=True):
+    """Expand directories and glob patterns into a sorted list of supported files"""
+    paths = set()
+    for target in targets:
+        if os.path.isdir(target):
+            pattern = os.path.join(target, '**', '*') if recursive else os.path.join(target, '*')
+            candidates = glob.glob(pattern, recursive=recursive)
+        else:
+            candidates = glob.glob(target, recursive=True)
+        for path in candidates:
+            if os.path.isfile(path) and os.path.splitext(path)[1].lstrip('.').lower() in MIME_TYPES:
+                paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def fingerprint_key(record):
+    # Path plus size and mtime: an edited file is analyzed again, an untouched one is never re-read
+    return (record['path'], record['size'], record['mtime_ns'])
+
+
+def load_checkpoint(output_path):
+    """Fingerprints already in the output file; failed records are left out so they get retried"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write can leave a truncated last line
+                continue
+            if record.get('status') in ('ok', 'skipped'):
+                done.add(fingerprint_key(record))
+    return done
+
+
+async def extract_file(path, file_type, extraction_cache, extract_pool, max_chars):
+    """Extracted text for path, parsing it in the process pool only when the extraction cache cannot serve it"""
+    loop = asyncio.get_running_loop()
+    if extraction_cache is None:
+        return (await loop.run_in_executor(extract_pool, extract_document, path, file_type, max_chars, 1))['text']
+    # Hashing and SQLite work stay off the event loop; files are already spread across processes, so each is parsed serially
+    key = await loop.run_in_executor(None, content_key, path, file_type)
+    document = await loop.run_in_executor(None, extraction_cache.get, key, max_chars)
+    telemetry.annotate(extraction_cache='miss' if document is None else 'hit')
+    if document is None:
+        document = await loop.run_in_executor(extract_pool, extract_document, path, file_type, max_chars, 1)
+        await loop.run_in_executor(None, extraction_cache.set, key, document)
+    return document['text']
+
+
+async def process_file(path, analyzer, extract_pool, extraction_cache, slots, args):
+    record = file_fingerprint(path)
+    file_type = mime_type_for_path(path)
+    started = time.perf_counter()
+    async with slots:
+        with telemetry.request(source='batch', path=path, file_type=file_type, bytes=record['size']):
+            try:
+                with telemetry.span('extract'):
+                    text = await extract_file(path, file_type, extraction_cache, extract_pool, args.max_chars)
+                extracted = time.perf_counter()
+                record['chars'] = len(text) if text else 0
+                telemetry.annotate(chars=record['chars'])
+                telemetry.extracted_bytes.inc(record['size'], file_type=file_type)
+                telemetry.extracted_chars.inc(record['chars'], file_type=file_type)
+                if not text or len(text) < MIN_CHARS:
+                    record.update(status='skipped', reason=f'extracted fewer than {MIN_CHARS} characters')
+                    record['timings'] = {'extract': round(extracted - started, 4)}
+                    return record
+
+                if args.no_chunking:
+                    analysis = await analyzer.analyze_text(text, bypass_cache=args.bypass_cache)
+                else:
+                    analysis = await analyzer.analyze_chunked(text, max_chunk_tokens=args.max_chunk_tokens, bypass_cache=args.bypass_cache)
+                finished = time.perf_counter()
+                record.update(status='ok', **analysis)
+                record['timings'] = {
+                    'extract': round(extracted - started, 4),
+                    'analyze': round(finished - extracted, 4),
+                    'total': round(finished - started, 4)
+                }
+            except Exception as e:
+                telemetry.annotate(error=type(e).__name__)
+                record.update(status='error', error=f"{type(e).__name__}: {e}")
+                record['timings'] = {'total': round(time.perf_counter() - started, 4)}
+            return record
+
+
+async def run(args):
+    paths = discover_files(args.targets, recursive=not args.no_recursive)
+    done = set() if args.restart else load_checkpoint(args.output)
+    pending = [p for p in paths if fingerprint_key(file_fingerprint(p)) not in done]
+    print(f"{len(paths)} files found, {len(paths) - len(pending)} already processed, {len(pending)} to go", file=sys.stderr)
+    if not pending:
+        return 0
+
+    prescreen = None
+    if args.prescreen:
+        bands = dict(human_below=args.human_below, ai_above=args.ai_above)
+        prescreen = StylometricPrescreen.load(args.prescreen_params, **bands)
+
+    token_budget = TokenBudget.from_env()
+    if args.max_input_tokens is not None:
+        token_budget.max_input_tokens = args.max_input_tokens
+    if args.expected_patterns is not None:
+        token_budget.expected_patterns = args.expected_patterns
+
+    if args.backends:
+        with open(args.backends, encoding='utf-8') as f:
+            backends = BackendPool.from_config(json.load(f))
+    else:
+        backends = BackendPool.from_env()
+
+    analyzer = AsyncAIGeneratedAnalyzer(
+        model=args.model,
+        base_url=args.base_url,
+        backends=backends,
+        max_concurrency=args.workers,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        prescreen=prescreen,
+        token_budget=token_budget,
+        packer=RequestPacker(latency_target=args.pack_latency_target) if args.pack else None
+    )
+    if args.json_log:
+        telemetry.log_path = args.json_log
+    if args.metrics_port:
+        telemetry.serve(args.metrics_port)
+    extraction_cache = None if args.no_extraction_cache else ExtractionCache()
+    slots = asyncio.Semaphore(args.workers)
+    counts = {'ok': 0, 'skipped': 0, 'error': 0}
+    mode = 'w' if args.restart else 'a'
+    try:
+        with ProcessPoolExecutor(max_workers=args.extract_workers, mp_context=POOL_CONTEXT) as extract_pool, open(args.output, mode, encoding='utf-8') as out:
+            tasks = [asyncio.ensure_future(process_file(p, analyzer, extract_pool, extraction_cache, slots, args)) for p in pending]
+            for next_done in asyncio.as_completed(tasks):
+                record = await next_done
+                # One flushed line per file is the checkpoint: an interrupted run resumes from here
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                out.flush()
+                counts[record['status']] += 1
+                print(f"[{sum(counts.values())}/{len(pending)}] {record['status']:7} {record['path']}", file=sys.stderr)
+    finally:
+        await analyzer.aclose()
+
+    print(f"done: {counts['ok']} ok, {counts['skipped']} skipped, {counts['error']} errors", file=sys.stderr)
+    usage = analyzer.usage_stats()
+    if extraction_cache is not None:
+        extraction = extraction_cache.stats()
+        print(f"extraction cache: {extraction['hits']} hits, {extraction['misses']} misses, "
+              f"{extraction['saved_seconds']:.1f}s of parsing saved", file=sys.stderr)
+        extraction_cache.close()
+    print(f"tokens: {usage['requests']} requests, {usage['prompt_tokens']} prompt, {usage['completion_tokens']} completion", file=sys.stderr)
+    if usage['prompt_cache_hit_rate'] is not None:
+        print(f"prefix cache ({analyzer.prompt_template.id}): {usage['prompt_cache_hit_tokens']} prompt tokens hit, "
+              f"{usage['prompt_cache_miss_tokens']} missed ({usage['prompt_cache_hit_rate']:.1%})", file=sys.stderr)
+    pool = analyzer.backend_stats()
+    if len(pool['backends']) > 1:
+        print(f"backends: {pool['hedges']} hedged ({pool['hedge_rate']:.1%}), {pool['hedge_wins']} won by the hedge; " +
+              ", ".join(f"{b['name']} {b['requests']} calls/{b['errors']} errors ({b['breaker']})" for b in pool['backends']), file=sys.stderr)
+    packing = analyzer.packer_stats()
+    if packing is not None and packing['packs']:
+        print(f"packing: {packing['packed_documents']} documents in {packing['packs']} packed requests "
+              f"(mean {packing['mean_pack_size']:.1f}), {packing['fallbacks']} fell back to single requests", file=sys.stderr)
+    if prescreen is not None:
+        stats = prescreen.stats()
+        print(f"pre-screen: {stats['local_human']} local human, {stats['local_ai']} local AI, "
+              f"{stats['escalated']} escalated ({stats['escalation_rate']:.1%}); "
+              f"pre-score histogram by decile: {stats['prescore_histogram']}", file=sys.stderr)
+    return 1 if counts['error'] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screen a directory or glob of documents for AI-generated content")
+    parser.add_argument('targets', nargs='+', help="Directories, files or glob patterns (TXT, PDF, DOCX, XLSX, XLS)")
+    parser.add_argument('-o', '--output', default='results.jsonl', help="JSONL output file, also used as the resume checkpoint")
+    parser.add_argument('-w', '--workers', type=int, default=8, help="Files analyzed concurrently")
+    parser.add_argument('--extract-workers', type=int, default=os.cpu_count(), help="Processes used for text extraction")
+    parser.add_argument('--model', default='deepseek-chat')
+    parser.add_argument('--base-url', default='https://api.deepseek.com')
+    parser.add_argument('--backends', default=None, help="JSON file listing endpoints to route and hedge between (overrides --model/--base-url)")
+    parser.add_argument('--rpm', type=int, default=None, help="Requests-per-minute limit")
+    parser.add_argument('--tpm', type=int, default=None, help="Tokens-per-minute limit")
+    parser.add_argument('--max-chunk-tokens', type=int, default=1500)
+    parser.add_argument('--max-input-tokens', type=int, default=None, help="Prompt token budget per request; longer texts are sampled")
+    parser.add_argument('--expected-patterns', type=int, default=None, help="Patterns to budget output tokens for")
+    parser.add_argument('--max-chars', type=int, default=None, help="Stop extracting a file after this many characters")
+    parser.add_argument('--no-chunking', action='store_true', help="Send each document as a single request")
+    parser.add_argument('--pack', action='store_true', help="Send short documents several to a request to cut per-request overhead")
+    parser.add_argument('--pack-latency-target', type=float, default=60.0, help="Seconds a packed request may be expected to take")
+    parser.add_argument('--no-recursive', action='store_true', help="Do not descend into subdirectories")
+    parser.add_argument('--bypass-cache', action='store_true', help="Ignore cached verdicts")
+    parser.add_argument('--no-extraction-cache', action='store_true', help="Re-extract every file instead of reusing earlier extractions")
+    parser.add_argument('--prescreen', action='store_true', help="Give clear-cut documents a local stylometric verdict (requires --prescreen-params)")
+    parser.add_argument('--prescreen-params', default=None, help="JSON weights from StylometricPrescreen.save()")
+    parser.add_argument('--human-below', type=float, default=10, help="Pre-scores at or below this are judged human locally")
+    parser.add_argument('--ai-above', type=float, default=90, help="Pre-scores at or above this are judged AI locally")
+    parser.add_argument('--json-log', default=None, help="Append one JSON timing record per file to this path ('-' for stderr)")
+    parser.add_argument('--metrics-port', type=int, default=None, help="Serve Prometheus metrics on this local port while running")
+    parser.add_argument('--restart', action='store_true', help="Ignore the existing output file and start over")
+    args = parser.parse_args(argv)
+    if args.prescreen and not args.prescreen_params:
+        # The built-in weights are uncalibrated and would never give a local verdict
+        parser.error("--prescreen needs --prescreen-params (weights fitted with StylometricPrescreen.fit())")
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import os
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+
+WORDS = (
+    "the report shows that our team reviewed each claim and found several items which need more detail "
+    "before approval travel expenses were higher than expected because the client meeting moved twice "
+    "however most receipts match the policy and the remaining questions are minor we recommend approving "
+    "the request after the missing invoice is attached analysis of the quarterly numbers suggests a steady "
+    "trend although some regions reported delays in processing"
+).split()
+
+# (label, TXT/DOCX characters, PDF pages, XLSX rows)
+SIZES = {
+    'small': (5_000, 5, 200),
+    'medium': (100_000, 50, 5_000),
+    'large': (1_000_000, 300, 50_000)
+}
+
+
+def synthetic_text(chars, seed=0):
+    """Prose-like ASCII text of roughly `chars` characters with sentence and paragraph breaks"""
+    rng = random.Random(seed)
+    paragraphs = []
+    total = 0
+    while total < chars:
+        sentences = []
+        for _ in range(rng.randint(3, 8)):
+            words = rng.choices(WORDS, k=rng.randint(6, 28))
+            sentences.append(' '.join(words).capitalize() + rng.choice('...!?'))
+        paragraph = ' '.join(sentences)
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return '\n\n'.join(paragraphs)[:chars]
+
+
+def make_txt(path, chars, seed=0):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(synthetic_text(chars, seed))
+
+
+def _pdf_escape(line):
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(path, pages, lines_per_page=45, seed=0):
+    # Minimal hand-written PDF (Helvetica text pages) so benchmarks need no PDF-writing dependency
+    rng = random.Random(seed)
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for _ in range(pages):
+        lines = [' '.join(rng.choices(WORDS, k=12)) for _ in range(lines_per_page)]
+        stream = "BT /F1 10 Tf 14 TL 40 800 Td " + ' '.join(f"({_pdf_escape(l)}) '" for l in lines) + " ET"
+        stream = stream.encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        page_ids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = ' '.join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b''.join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def make_docx(path, chars, seed=0):
+    paragraphs = synthetic_text(chars, seed).split('\n\n')
+    body = ''.join(f'<w:p><w:r><w:t xml:space="preserve">{escape(p)}</w:t></w:r></w:p>' for p in paragraphs)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'
+        ))
+        docx.writestr('_rels/.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/></Relationships>'
+        ))
+        docx.writestr('word/document.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{body}</w:body></w:document>'
+        ))
+
+
+def make_xlsx(path, rows, seed=0):
+    import openpyxl
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Claims')
+    sheet.append(['Claim ID', 'Amount', 'Description', 'Approver'])
+    for i in range(rows):
+        sheet.append([f'CLM-{i:06d}', round(rng.uniform(5, 5000), 2),
+                      ' '.join(rng.choices(WORDS, k=rng.randint(5, 20))), rng.choice(['Zhang Wei', 'Li Na', 'Wang Fang'])])
+    workbook.save(path)
+
+
+def build_corpus(directory, sizes=('small', 'medium'), seed=0):
+    """Write one file per format and size; returns [(format, size, path)]"""
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for size in sizes:
+        chars, pages, rows = SIZES[size]
+        for fmt, writer, amount in (('txt', make_txt, chars), ('pdf', make_pdf, pages),
+                                    ('docx', make_docx, chars), ('xlsx', make_xlsx, rows)):
+            path = os.path.join(directory, f'{size}.{fmt}')
+            if not os.path.exists(path):
+                writer(path, amount, seed=seed)
+            files.append((fmt, size, path))
+    return files
@@ -0,0 +1,237 @@
+import argparse
+import hashlib
+from collections import OrderedDict
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+PATTERN_NAMES = ['句式结构规整', '过渡词使用频繁', '词汇重复', '缺乏个人观点', '论证模板化', '情感表达平淡']
+CONFIDENCES = ['High', 'Medium', 'Low']
+
+
+def canned_response(prompt, patterns=3):
+    """Deterministic reply in the analyzer's '## AI Score' format, seeded by the prompt"""
+    rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).digest())
+    lines = [
+        f"## AI Score: {rng.randint(0, 100)}/100",
+        "## Conclusion: 基准测试用的模拟结论",
+        "## Patterns:"
+    ]
+    for name in rng.sample(PATTERN_NAMES, min(patterns, len(PATTERN_NAMES))):
+        lines.append(f"- {name}: 模拟的模式描述 (Confidence: {rng.choice(CONFIDENCES)})")
+    return '\n'.join(lines)
+
+
+def packed_response(prompt, document_ids, patterns=3):
+    """One '### Document:' section per packed document, each seeded by that document's text"""
+    sections = []
+    for document_id in document_ids:
+        body = prompt.split(f"<<<DOC {document_id}>>>", 1)[1].split(f"<<<END {document_id}>>>", 1)[0]
+        sections.append(f"### Document: {document_id}\n" + canned_response(body, patterns))
+    return '\n\n'.join(sections)
+
+
+class LatencyModel:
+    """Seeded latency distribution: fixed, uniform, exponential or lognormal (all in seconds)"""
+
+    def __init__(self, distribution='lognormal', median=0.2, spread=0.5, seed=0):
+        self.distribution = distribution
+        self.median = median
+        self.spread = spread
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            if self.distribution == 'fixed':
+                return self.median
+            if self.distribution == 'uniform':
+                return self._rng.uniform(max(0.0, self.median - self.spread), self.median + self.spread)
+            if self.distribution == 'exponential':
+                return self._rng.expovariate(1.0 / self.median)
+            # lognormal: median is exp(mu), spread is sigma
+            return self._rng.lognormvariate(0, self.spread) * self.median
+
+
+class FakeChatServer(ThreadingHTTPServer):
+    """OpenAI-compatible /chat/completions stand-in with configurable latency and error injection"""
+
+    daemon_threads = True
+    # socketserver's default backlog of 5 overflows under the benchmark's connection bursts, and the SYN retransmit
+    # that follows would show up as analyzer tail latency
+    request_queue_size = 128
+
+    def __init__(self, host='127.0.0.1', port=0, latency=None, error_rate=0.0, error_statuses=(429, 500, 503),
+                 patterns=3, token_delay=0.005, decode_delay=0.0, prefill_delay=0.0, prefix_cache_size=10000, seed=0):
+        super().__init__((host, port), _Handler)
+        self.latency = latency or LatencyModel(seed=seed)
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.patterns = patterns
+        self.token_delay = token_delay
+        # Per completion token on non-streamed replies, so longer (e.g. packed) replies take longer
+        self.decode_delay = decode_delay
+        # Per uncached prompt token, so prompts that hit the simulated prefix cache answer sooner
+        self.prefill_delay = prefill_delay
+        self.prefix_cache_size = prefix_cache_size
+        self._prefixes = OrderedDict()
+        self._rng = random.Random(seed + 1)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='fake-chat-server', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # Clients that abandon a request (e.g. the losing half of a hedge) are expected, not errors
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    def cached_prefix_chars(self, prompt, unit=256):
+        """Longest previously seen prefix, in whole units as provider prefix caches store it, then remember this prompt"""
+        hit = 0
+        with self._lock:
+            for end in range(unit, len(prompt) + 1, unit):
+                digest = hashlib.sha256(prompt[:end].encode('utf-8')).digest()
+                if digest in self._prefixes:
+                    self._prefixes.move_to_end(digest)
+                    if hit == end - unit:
+                        hit = end
+                else:
+                    self._prefixes[digest] = True
+            while len(self._prefixes) > self.prefix_cache_size:
+                self._prefixes.popitem(last=False)
+        return hit
+
+    def next_error(self):
+        with self._lock:
+            self.requests += 1
+            if self._rng.random() < self.error_rate:
+                self.errors += 1
+                return self._rng.choice(self.error_statuses)
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; Nagle + delayed ACK would add ~40 ms to every request
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=()):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f'unknown path {self.path}'}})
+            return
+
+        server = self.server
+        time.sleep(server.latency.sample())
+        status = server.next_error()
+        if status is not None:
+            self._send_json(status, {'error': {'message': 'injected error', 'type': 'fake_server'}},
+                            headers=[('Retry-After', '0')] if status == 429 else ())
+            return
+
+        prompt = ''.join(m.get('content', '') for m in request.get('messages', []))
+        document_ids = re.findall(r'^\s*<<<DOC (\w+)>>>\s*$', prompt, re.MULTILINE)
+        content = packed_response(prompt, document_ids, server.patterns) if document_ids else canned_response(prompt, server.patterns)
+        prompt_tokens = max(1, len(prompt) // 4)
+        cache_hit_tokens = min(prompt_tokens, server.cached_prefix_chars(prompt) // 4)
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': max(1, len(content) // 2),
+            'total_tokens': prompt_tokens + max(1, len(content) // 2),
+            # DeepSeek's context caching fields
+            'prompt_cache_hit_tokens': cache_hit_tokens,
+            'prompt_cache_miss_tokens': prompt_tokens - cache_hit_tokens
+        }
+        time.sleep(server.prefill_delay * usage['prompt_cache_miss_tokens'])
+        model = request.get('model', 'fake-model')
+        created = int(time.time())
+        if request.get('stream'):
+            self._stream(content, model, created, usage, request)
+            return
+        time.sleep(server.decode_delay * usage['completion_tokens'])
+        self._send_json(200, {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': created,
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': usage
+        })
+
+    def _stream(self, content, model, created, usage, request):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        def event(payload):
+            self.wfile.write(b'data: ' + json.dumps(payload, ensure_ascii=False).encode('utf-8') + b'\n\n')
+            self.wfile.flush()
+
+        base = {'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': created, 'model': model}
+        for i in range(0, len(content), 8):
+            event(dict(base, choices=[{'index': 0, 'delta': {'content': content[i:i + 8]}, 'finish_reason': None}]))
+            time.sleep(self.server.token_delay)
+        event(dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))
+        if (request.get('stream_options') or {}).get('include_usage'):
+            event(dict(base, choices=[], usage=usage))
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in for offline benchmarks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', default='lognormal', choices=['fixed', 'uniform', 'exponential', 'lognormal'])
+    parser.add_argument('--median', type=float, default=0.2, help="Median (or fixed/mean) latency in seconds")
+    parser.add_argument('--spread', type=float, default=0.5, help="Lognormal sigma or uniform half-width")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    server = FakeChatServer(args.host, args.port, LatencyModel(args.latency, args.median, args.spread, args.seed),
+                            error_rate=args.error_rate, seed=args.seed)
+    print(f"Serving fake chat completions at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_generated_analyzer import AIGeneratedAnalyzer
+from scoring_api import ScoringServer
+from benchmarks.corpus import synthetic_text
+from benchmarks.fake_server import FakeChatServer, LatencyModel
+
+
+def load_test(api_url, texts, requests, concurrency, duplicate_rate, seed=0):
+    """Closed-loop clients posting texts; duplicate_rate of requests reuse a small hot set to exercise coalescing"""
+    rng = random.Random(seed)
+    hot = texts[:max(1, len(texts) // 50)]
+    bodies = [json.dumps({'text': rng.choice(hot) if rng.random() < duplicate_rate else texts[i % len(texts)]}).encode('utf-8')
+              for i in range(requests)]
+    target = urlparse(api_url)
+    latencies, statuses, coalesced = [], {}, 0
+    lock = threading.Lock()
+    local = threading.local()
+
+    def post(body):
+        nonlocal coalesced
+        if getattr(local, 'connection', None) is None:
+            local.connection = http.client.HTTPConnection(target.hostname, target.port, timeout=120)
+        started = time.perf_counter()
+        try:
+            local.connection.request('POST', '/v1/analyze', body=body, headers={'Content-Type': 'application/json'})
+            response = local.connection.getresponse()
+            response.read()
+            status = response.status
+            was_coalesced = response.getheader('X-Coalesced') == '1'
+        except (OSError, http.client.HTTPException):
+            local.connection.close()
+            local.connection = None
+            status, was_coalesced = 'connection_error', False
+        elapsed = time.perf_counter() - started
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(elapsed)
+                coalesced += was_coalesced
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(post, bodies))
+    wall = time.perf_counter() - started
+    result = {
+        'requests': requests,
+        'concurrency': concurrency,
+        'statuses': {str(k): v for k, v in statuses.items()},
+        'coalesced': coalesced,
+        'requests_per_second': requests / wall
+    }
+    if latencies:
+        result['latency_seconds'] = {p: float(np.percentile(latencies, q)) for p, q in (('p50', 50), ('p95', 95), ('p99', 99))}
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the scoring API against a local model stand-in")
+    parser.add_argument('--api-url', default=None, help="Test an already running scoring API instead of starting one in-process")
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duplicate-rate', type=float, default=0.3, help="Fraction of requests drawn from a small set of hot texts")
+    parser.add_argument('--max-in-flight', type=int, default=64)
+    parser.add_argument('--median', type=float, default=0.2, help="Median simulated model latency in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default=None, help="Write the results as JSON")
+    args = parser.parse_args(argv)
+
+    texts = [synthetic_text(1500, seed=args.seed * 100000 + i) for i in range(max(50, args.requests // 2))]
+    model_server = api = analyzer = None
+    try:
+        api_url = args.api_url
+        if api_url is None:
+            model_server = FakeChatServer(latency=LatencyModel('lognormal', args.median, 0.5, args.seed),
+                                          error_rate=args.error_rate, seed=args.seed).start()
+            # No verdict cache, so repeated texts reach the model unless they are coalesced in flight
+            analyzer = AIGeneratedAnalyzer(cache=False, base_url=model_server.base_url, api_key='load-test',
+                                           max_concurrency=args.max_in_flight, backoff_base=0.01)
+            api = ScoringServer(analyzer, port=0, max_in_flight=args.max_in_flight).start()
+            api_url = api.url
+
+        result = load_test(api_url, texts, args.requests, args.concurrency, args.duplicate_rate, args.seed)
+        if model_server is not None:
+            result['upstream_calls'] = model_server.requests
+        latency = result.get('latency_seconds')
+        print(f"{result['requests_per_second']:.1f} req/s · statuses {result['statuses']} · coalesced {result['coalesced']}"
+              + (f" · upstream calls {result['upstream_calls']}" if 'upstream_calls' in result else "")
+              + (f" · p50 {latency['p50'] * 1000:.0f} ms p95 {latency['p95'] * 1000:.0f} ms p99 {latency['p99'] * 1000:.0f} ms" if latency else ""),
+              file=sys.stderr)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2)
+    finally:
+        if api is not None:
+            api.stop()
+        if analyzer is not None:
+            analyzer.close()
+        if model_server is not None:
+            model_server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_generated_analyzer import AIGeneratedAnalyzer, AsyncAIGeneratedAnalyzer
+from backend_pool import Backend, BackendPool
+from request_packer import RequestPacker
+from prompt_templates import TEMPLATES
+from text_extraction import extract_text_from_path
+from benchmarks.corpus import build_corpus, synthetic_text
+from benchmarks.fake_server import FakeChatServer, LatencyModel, canned_response
+
+
+def percentiles(samples):
+    values = np.asarray(samples, dtype=float)
+    return {
+        'p50': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)),
+        'p99': float(np.percentile(values, 99)),
+        'mean': float(values.mean()),
+        'max': float(values.max())
+    }
+
+
+async def _run_requests(base_url, texts, concurrency, backends=None):
+    analyzer = AsyncAIGeneratedAnalyzer(cache=False, base_url=base_url, api_key='benchmark',
+                                        max_concurrency=concurrency, backoff_base=0.01, backends=backends)
+    latencies = []
+    failures = 0
+    pending = list(reversed(texts))
+
+    # A fixed pool of closed-loop clients, so latency is per request rather than time spent queued
+    async def client():
+        nonlocal failures
+        while pending:
+            text = pending.pop()
+            started = time.perf_counter()
+            try:
+                await analyzer.analyze_text(text)
+            except Exception:
+                failures += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    await analyzer.aclose()
+    return latencies, failures, wall
+
+
+def bench_end_to_end(server, requests, concurrency_levels, seed):
+    results = {}
+    for concurrency in concurrency_levels:
+        # Distinct texts per level so nothing is served from a cache
+        texts = [synthetic_text(1500, seed=seed * 100000 + concurrency * 1000 + i) for i in range(requests)]
+        latencies, failures, wall = asyncio.run(_run_requests(server.base_url, texts, concurrency))
+        results[f'concurrency_{concurrency}'] = {
+            'requests': requests,
+            'failures': failures,
+            'requests_per_second': len(latencies) / wall,
+            'latency_seconds': percentiles(latencies) if latencies else None
+        }
+        print(f"  concurrency {concurrency:>3}: {len(latencies) / wall:8.1f} req/s  "
+              f"p50 {np.percentile(latencies, 50) * 1000:7.1f} ms  p99 {np.percentile(latencies, 99) * 1000:7.1f} ms", file=sys.stderr)
+    return results
+
+
+def bench_hedging(requests, concurrency, median, seed):
+    """Two heavy-tailed stand-in backends, with and without hedging, then with one of them failing"""
+    servers = [FakeChatServer(latency=LatencyModel('lognormal', median, 1.0, seed + i), seed=seed + i).start() for i in range(2)]
+    results = {}
+    try:
+        for label, hedge_percentile in (('single', None), ('hedged', 95)):
+            if hedge_percentile is None:
+                backends = BackendPool([Backend(servers[0].base_url, 'deepseek-chat', api_key='benchmark')])
+            else:
+                # A short warm-up, so that at the default --requests most calls are hedged rather than merely split
+                # across the two backends
+                backends = BackendPool([Backend(server.base_url, 'deepseek-chat', api_key='benchmark') for server in servers],
+                                       hedge_percentile=hedge_percentile, min_samples=5, seed=seed)
+            texts = [synthetic_text(1500, seed=seed * 100000 + 50000 + i) for i in range(requests)]
+            latencies, failures, wall = asyncio.run(_run_requests(None, texts, concurrency, backends))
+            stats = backends.stats()
+            results[label] = {
+                'failures': failures,
+                'latency_seconds': percentiles(latencies),
+                'hedge_rate': stats['hedge_rate'],
+                'extra_requests': sum(s.requests for s in servers) / max(1, len(latencies)) - 1
+            }
+            for server in servers:
+                server.requests = 0
+            print(f"  {label:>7}: p50 {np.percentile(latencies, 50) * 1000:7.1f} ms  p99 {np.percentile(latencies, 99) * 1000:7.1f} ms  "
+                  f"hedged {stats['hedge_rate']:.1%}", file=sys.stderr)
+
+        # Take one backend down: its breaker should open and traffic should move to the other
+        servers[1].error_rate = 1.0
+        backends = BackendPool([Backend(server.base_url, 'deepseek-chat', api_key='benchmark') for server in servers], seed=seed)
+        texts = [synthetic_text(1500, seed=seed * 100000 + 70000 + i) for i in range(requests)]
+        latencies, failures, wall = asyncio.run(_run_requests(None, texts, concurrency, backends))
+        stats = backends.stats()
+        results['one_backend_down'] = {
+            'failures': failures,
+            'latency_seconds': percentiles(latencies),
+            'calls_to_failing_backend': stats['backends'][1]['requests'],
+            'breaker': stats['backends'][1]['breaker']
+        }
+        print(f"  failover: {failures} failures, {stats['backends'][1]['requests']} calls to the failing backend "
+              f"(breaker {stats['backends'][1]['breaker']})", file=sys.stderr)
+    finally:
+        for server in servers:
+            server.stop()
+    return results
+
+
+def bench_packing(requests, concurrency, median, seed):
+    """Short documents sent one per request versus packed, against a stand-in whose reply time grows with length"""
+    server = FakeChatServer(latency=LatencyModel('fixed', median, 0, seed), decode_delay=0.0005, seed=seed).start()
+    texts = [synthetic_text(400, seed=seed * 100000 + 90000 + i) for i in range(requests)]
+    results = {}
+
+    async def run(packer):
+        analyzer = AsyncAIGeneratedAnalyzer(cache=False, base_url=server.base_url, api_key='benchmark',
+                                            max_concurrency=concurrency, backoff_base=0.01, packer=packer)
+        latencies = []
+        pending = list(reversed(texts))
+
+        # Many more open submissions than model slots, as under high-volume short-form traffic
+        async def client():
+            while pending:
+                text = pending.pop()
+                started = time.perf_counter()
+                await analyzer.analyze_text(text)
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency * 8)))
+        wall = time.perf_counter() - started
+        await analyzer.aclose()
+        return latencies, wall, analyzer.usage_stats(), analyzer.packer_stats()
+
+    try:
+        for label, packer in (('single', None), ('packed', RequestPacker())):
+            server.requests = 0
+            latencies, wall, usage, packing = asyncio.run(run(packer))
+            results[label] = {
+                'documents_per_second': len(latencies) / wall,
+                'latency_seconds': percentiles(latencies),
+                'model_requests': server.requests,
+                'prompt_tokens_per_document': usage['prompt_tokens'] / len(latencies),
+                'mean_pack_size': packing['mean_pack_size'] if packing else None,
+                'fallback_rate': packing['fallback_rate'] if packing else None
+            }
+            print(f"  {label:>7}: {len(latencies) / wall:8.1f} docs/s  {server.requests} model requests  "
+                  f"{usage['prompt_tokens'] / len(latencies):6.0f} prompt tokens/doc  p50 {np.percentile(latencies, 50) * 1000:7.1f} ms", file=sys.stderr)
+    finally:
+        server.stop()
+    return results
+
+
+def bench_time_to_first_event(server, requests, seed):
+    analyzer = AIGeneratedAnalyzer(cache=False, base_url=server.base_url, api_key='benchmark', backoff_base=0.01)
+    first, total = [], []
+    for i in range(requests):
+        started = time.perf_counter()
+        for n, (kind, _) in enumerate(analyzer.analyze_text_stream(synthetic_text(1500, seed=seed + 7 + i))):
+            if n == 0:
+                first.append(time.perf_counter() - started)
+        total.append(time.perf_counter() - started)
+    analyzer.close()
+    return {'first_event_seconds': percentiles(first), 'complete_seconds': percentiles(total)}
+
+
+def bench_prompt_cache(requests, median, seed):
+    """Provider prefix-cache hit rate and time to first event for each registered 'analyze' template version"""
+    results = {}
+    for template in sorted((t for t in TEMPLATES.values() if t.name == 'analyze'), key=lambda t: t.version):
+        # A fresh stand-in per version so neither inherits the other's cached prefixes
+        server = FakeChatServer(latency=LatencyModel('fixed', median, 0, seed), prefill_delay=0.0005, seed=seed).start()
+        analyzer = AIGeneratedAnalyzer(cache=False, base_url=server.base_url, api_key='benchmark', backoff_base=0.01,
+                                       prompt_template=template)
+        first = []
+        try:
+            for i in range(requests):
+                started = time.perf_counter()
+                for n, _ in enumerate(analyzer.analyze_text_stream(synthetic_text(1500, seed=seed + 11 + i))):
+                    if n == 0:
+                        first.append(time.perf_counter() - started)
+            usage = analyzer.usage_stats()
+        finally:
+            analyzer.close()
+            server.stop()
+        results[template.id] = {
+            'prefix_share': template.prefix_share,
+            'prompt_cache_hit_rate': usage['prompt_cache_hit_rate'],
+            'first_event_seconds': percentiles(first)
+        }
+        print(f"  {template.id:>12}: prefix cache hit rate {usage['prompt_cache_hit_rate']:.1%}  "
+              f"first event p50 {np.percentile(first, 50) * 1000:7.1f} ms", file=sys.stderr)
+    return results
+
+
+def bench_extraction(directory, sizes, repeat, seed):
+    results = {}
+    for fmt, size, path in build_corpus(directory, sizes, seed):
+        timings = []
+        chars = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            chars = len(extract_text_from_path(path) or '')
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        results[f'{fmt}_{size}'] = {
+            'bytes': os.path.getsize(path),
+            'chars': chars,
+            'seconds_min': best,
+            'seconds_median': statistics.median(timings),
+            'megabytes_per_second': os.path.getsize(path) / best / 1e6
+        }
+        print(f"  {fmt:>4} {size:<6}: {best * 1000:9.1f} ms  {chars:>9} chars", file=sys.stderr)
+    return results
+
+
+def bench_parse(iterations, seed):
+    analyzer = AIGeneratedAnalyzer(cache=False)
+    responses = [canned_response(f'{seed}-{i}', patterns=6) for i in range(100)]
+    started = time.perf_counter()
+    for i in range(iterations):
+        analyzer._parse_response(responses[i % len(responses)])
+    elapsed = time.perf_counter() - started
+    return {'iterations': iterations, 'parses_per_second': iterations / elapsed, 'microseconds_per_parse': elapsed / iterations * 1e6}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def _flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f'{prefix}.{key}' if prefix else key, item, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+
+def compare(previous, current):
+    """Print the relative change of every numeric metric present in both result files"""
+    before = _flatten('', previous.get('results', {}), {})
+    after = _flatten('', current.get('results', {}), {})
+    print(f"\nChange vs {previous.get('environment', {}).get('git_commit') or 'previous run'}:")
+    for key in sorted(before.keys() & after.keys()):
+        if before[key]:
+            print(f"  {key:<70} {before[key]:>12.4g} -> {after[key]:>12.4g}  ({(after[key] - before[key]) / before[key]:+.1%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline throughput/latency benchmarks against a local fake model server")
+    parser.add_argument('-o', '--output', default='bench_results.json')
+    parser.add_argument('--compare', default=None, help="Earlier results file to diff against")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', default='1,8,32', help="Comma-separated concurrency levels")
+    parser.add_argument('--latency', default='lognormal', choices=['fixed', 'uniform', 'exponential', 'lognormal'])
+    parser.add_argument('--median', type=float, default=0.05, help="Median simulated model latency in seconds")
+    parser.add_argument('--spread', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--sizes', default='small,medium', help="Corpus sizes: small, medium, large")
+    parser.add_argument('--corpus-dir', default=None, help="Reuse generated files between runs")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip', default='', help="Comma-separated sections to skip: api, stream, prompt, hedge, pack, extract, parse")
+    args = parser.parse_args(argv)
+    skip = set(filter(None, args.skip.split(',')))
+
+    report = {
+        'environment': environment(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        'results': {}
+    }
+    server = FakeChatServer(latency=LatencyModel(args.latency, args.median, args.spread, args.seed),
+                            error_rate=args.error_rate, seed=args.seed).start()
+    try:
+        if 'api' not in skip:
+            print("End-to-end requests:", file=sys.stderr)
+            levels = [int(c) for c in args.concurrency.split(',')]
+            report['results']['end_to_end'] = bench_end_to_end(server, args.requests, levels, args.seed)
+        if 'stream' not in skip:
+            print("Streaming time to first event...", file=sys.stderr)
+            report['results']['streaming'] = bench_time_to_first_event(server, min(args.requests, 20), args.seed)
+    finally:
+        server.stop()
+
+    if 'hedge' not in skip:
+        print("Backend pool hedging and failover:", file=sys.stderr)
+        report['results']['hedging'] = bench_hedging(args.requests, 8, args.median, args.seed)
+
+    if 'prompt' not in skip:
+        print("Prompt template prefix caching:", file=sys.stderr)
+        report['results']['prompt_cache'] = bench_prompt_cache(min(args.requests, 20), args.median, args.seed)
+
+    if 'pack' not in skip:
+        print("Packed short documents:", file=sys.stderr)
+        report['results']['packing'] = bench_packing(args.requests, 8, args.median, args.seed)
+
+    if 'extract' not in skip:
+        print("Text extraction:", file=sys.stderr)
+        sizes = [s for s in args.sizes.split(',') if s]
+        if args.corpus_dir:
+            report['results']['extraction'] = bench_extraction(args.corpus_dir, sizes, args.repeat, args.seed)
+        else:
+            with tempfile.TemporaryDirectory() as directory:
+                report['results']['extraction'] = bench_extraction(directory, sizes, args.repeat, args.seed)
+    if 'parse' not in skip:
+        report['results']['parse_response'] = bench_parse(20000, args.seed)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from array import array
+from instrumentation import telemetry
+from text_extraction import EXTRACTOR_VERSION, TEXT_BLOCK_SIZE, extract_document
+from sqlite_store import open_database
+
+
+def content_key(source, file_type):
+    """Address an extraction by the uploaded bytes, their declared type and the extractor version"""
+    h = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(TEXT_BLOCK_SIZE * 16), b''):
+                h.update(block)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        h.update(source)
+    else:
+        source.seek(0)
+        for block in iter(lambda: source.read(TEXT_BLOCK_SIZE * 16), b''):
+            h.update(block)
+        source.seek(0)
+    return f"{h.hexdigest()}:{file_type}:{EXTRACTOR_VERSION}"
+
+
+class ExtractionCache:
+    """Compressed SQLite store of extracted documents, bounded by size with least-recently-used eviction"""
+
+    def __init__(self, path=None, max_bytes=512 * 1024 * 1024, compression_level=6):
+        self.path = path or os.getenv('EXTRACTION_CACHE_PATH', os.path.join('.cache', 'extractions.sqlite3'))
+        self.max_bytes = max_bytes
+        self.compression_level = compression_level
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+
+        self._db = open_database(self.path)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                text BLOB NOT NULL,
+                page_offsets BLOB,
+                meta TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._db.execute('CREATE INDEX IF NOT EXISTS extractions_accessed_at ON extractions (accessed_at)')
+        self._db.commit()
+        self._total_bytes = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM extractions').fetchone()[0]
+
+        self.lookups = telemetry.counter('analyzer_extraction_cache_total', 'Extraction cache lookups by result', ('result',))
+        telemetry.gauge('analyzer_extraction_cache_bytes', 'Compressed bytes held by the extraction cache', lambda: self._total_bytes)
+
+    def get(self, key, max_chars=None):
+        """Cached document for key, or None if absent or cut shorter than max_chars needs"""
+        with self._lock:
+            row = self._db.execute('SELECT text, page_offsets, meta FROM extractions WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                self.lookups.inc(result='miss')
+                return None
+            text, page_offsets, meta = row
+            meta = json.loads(meta)
+            if not meta['complete'] and (max_chars is None or meta['chars'] < max_chars):
+                self.misses += 1
+                self.lookups.inc(result='miss')
+                return None
+            self._db.execute('UPDATE extractions SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            self.lookups.inc(result='hit')
+            self.saved_seconds += meta['extract_seconds']
+
+        text = zlib.decompress(text).decode('utf-8')
+        offsets = None
+        if page_offsets is not None:
+            offsets = array('Q')
+            offsets.frombytes(zlib.decompress(page_offsets))
+            offsets = offsets.tolist()
+        if max_chars is not None and len(text) > max_chars:
+            text = text[:max_chars]
+            if offsets is not None:
+                offsets = [offset for offset in offsets if offset < max_chars]
+        return dict(meta, text=text, page_offsets=offsets, cached=True)
+
+    def set(self, key, document):
+        text = zlib.compress(document['text'].encode('utf-8'), self.compression_level)
+        offsets = None
+        if document.get('page_offsets') is not None:
+            offsets = zlib.compress(array('Q', document['page_offsets']).tobytes(), self.compression_level)
+        meta = {name: value for name, value in document.items() if name not in ('text', 'page_offsets', 'cached')}
+        meta['chars'] = len(document['text'])
+        size = len(text) + len(offsets or b'') + len(key)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            previous = self._db.execute('SELECT size FROM extractions WHERE key = ?', (key,)).fetchone()
+            self._db.execute(
+                'INSERT OR REPLACE INTO extractions (key, text, page_offsets, meta, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, text, offsets, json.dumps(meta), size, now, now)
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        # Drop least recently used documents in batches until the store is back under its byte budget
+        while self._total_bytes > self.max_bytes:
+            rows = self._db.execute('SELECT key, size FROM extractions ORDER BY accessed_at LIMIT 32').fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for key, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self._db.execute('DELETE FROM extractions WHERE key = ?', (key,))
+                self._total_bytes -= size
+
+    def extract(self, source, file_type, max_chars=None, workers=None, key=None):
+        """Document for source, parsing it only when no usable cached extraction exists"""
+        key = key or content_key(source, file_type)
+        document = self.get(key, max_chars)
+        if document is None:
+            document = dict(extract_document(source, file_type, max_chars=max_chars, workers=workers), cached=False)
+            self.set(key, document)
+        telemetry.annotate(extraction_cache='hit' if document['cached'] else 'miss')
+        return document
+
+    def stats(self):
+        with self._lock:
+            items, raw_chars = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(json_extract(meta, '$.chars')), 0) FROM extractions"
+            ).fetchone()
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'items': items,
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                # Characters of extracted text per stored byte
+                'compression_ratio': raw_chars / self._total_bytes if self._total_bytes else None,
+                'saved_seconds': self.saved_seconds
+            }
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM extractions')
+            self._db.commit()
+            self._total_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,269 @@
+import bisect
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Seconds; spans from sub-millisecond parses up to slow long-document model calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# The request record spans report into; copied into tasks so chunked and streamed calls share it
+_current_request = contextvars.ContextVar('analyzer_request', default=None)
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_label_text(self.labels, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        names = self.labels + ('le',)
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{_label_text(names, key + (bound,))} {cumulative}')
+                lines.append(f'{self.name}_sum{_label_text(self.labels, key)} {total}')
+                lines.append(f'{self.name}_count{_label_text(self.labels, key)} {count}')
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time, for levels such as queue depth"""
+
+    def __init__(self, name, help, callback):
+        self.name = name
+        self.help = help
+        self.callback = callback
+
+    def render(self):
+        try:
+            value = self.callback()
+        except Exception:
+            # A failing callback (e.g. a closed database) should not break the whole scrape
+            return []
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge', f'{self.name} {value}']
+
+
+class Telemetry:
+    """Per-stage timing spans and counters, exported in Prometheus text format and as per-request JSON lines
+
+    Spans cost two perf_counter calls and one short lock, so instrumentation stays on in production.
+    """
+
+    def __init__(self, log_path=None):
+        self.stage_seconds = Histogram('analyzer_stage_seconds', 'Time spent in each pipeline stage', ('stage',))
+        self.stages = Counter('analyzer_stage_total', 'Pipeline stage executions by outcome', ('stage', 'outcome'))
+        self.request_seconds = Histogram('analyzer_request_seconds', 'End-to-end time per analysis request', ('source',))
+        self.requests = Counter('analyzer_requests_total', 'Analysis requests by cache status and outcome', ('source', 'cache_status', 'outcome'))
+        self.lookups = Counter('analyzer_lookups_total', 'Verdict lookups by result', ('result',))
+        self.tokens = Counter('analyzer_tokens_total', 'Provider-reported tokens (prompt, completion, prompt_cache_hit, prompt_cache_miss)', ('kind',))
+        self.retries = Counter('analyzer_retries_total', 'Model API retries by reason', ('reason',))
+        self.backend_requests = Counter('analyzer_backend_requests_total', 'Model calls per backend by outcome', ('backend', 'outcome'))
+        self.first_token_seconds = Histogram('analyzer_first_token_seconds', 'Time to the first streamed token by prompt template', ('prompt_template',))
+        self.hedges = Counter('analyzer_hedges_total', 'Hedged duplicate requests by whether the duplicate won', ('result',))
+        self.extracted_bytes = Counter('analyzer_extracted_bytes_total', 'Bytes of uploaded documents extracted', ('file_type',))
+        self.extracted_chars = Counter('analyzer_extracted_chars_total', 'Characters of text extracted', ('file_type',))
+        self.metrics = [self.stage_seconds, self.stages, self.request_seconds, self.requests, self.lookups,
+                        self.tokens, self.retries, self.backend_requests, self.hedges, self.first_token_seconds,
+                        self.extracted_bytes, self.extracted_chars]
+        self._registry_lock = threading.Lock()
+        # '-' logs to stderr; None disables the per-request JSON log
+        self.log_path = log_path
+        self._log_file = None
+        self._log_lock = threading.Lock()
+
+    @contextmanager
+    def request(self, source='api', **attributes):
+        """Scope one analysis; nested calls join the enclosing request instead of starting a new one"""
+        record = _current_request.get()
+        if record is not None:
+            # The outer scope already describes the whole input (e.g. a document rather than one chunk)
+            for name, value in attributes.items():
+                record.setdefault(name, value)
+            yield record
+            return
+
+        record = {'request_id': uuid.uuid4().hex[:16], 'source': source, 'timestamp': time.time(), 'stages': {}}
+        record.update(attributes)
+        token = _current_request.set(record)
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            yield record
+        except Exception as e:
+            outcome = 'error'
+            record['error'] = type(e).__name__
+            raise
+        finally:
+            try:
+                _current_request.reset(token)
+            except ValueError:
+                # An async generator finalized from another task runs in a different context
+                pass
+            elapsed = time.perf_counter() - started
+            # Callers that handle an error themselves can still mark the request failed via annotate(error=...)
+            record['outcome'] = outcome = 'error' if 'error' in record else outcome
+            record['seconds'] = round(elapsed, 6)
+            self.request_seconds.observe(elapsed, source=source)
+            self.requests.inc(source=source, cache_status=record.get('cache_status', 'none'), outcome=outcome)
+            if self.log_path:
+                self._write_log(record)
+
+    @contextmanager
+    def span(self, stage, **attributes):
+        """Time one pipeline stage and attach its attributes to the current request"""
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            yield
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stage_seconds.observe(elapsed, stage=stage)
+            self.stages.inc(stage=stage, outcome=outcome)
+            record = _current_request.get()
+            if record is not None:
+                # Stages that run more than once per request (chunks, retries) add up
+                record['stages'][stage] = round(record['stages'].get(stage, 0) + elapsed, 6)
+                record.update(attributes)
+
+    def annotate(self, **attributes):
+        record = _current_request.get()
+        if record is not None:
+            record.update(attributes)
+
+    def accumulate(self, **amounts):
+        record = _current_request.get()
+        if record is not None:
+            for name, amount in amounts.items():
+                record[name] = record.get(name, 0) + amount
+
+    def note_lookup(self, result):
+        self.lookups.inc(result=result)
+        record = _current_request.get()
+        if record is not None:
+            # A chunked request whose sections were resolved differently is reported as 'mixed'
+            previous = record.get('cache_status')
+            record['cache_status'] = result if previous in (None, result) else 'mixed'
+
+    def _register(self, metric, replace=False):
+        # Components created more than once per process (e.g. after a cache reset) share one series
+        with self._registry_lock:
+            for index, existing in enumerate(self.metrics):
+                if existing.name == metric.name:
+                    if replace:
+                        self.metrics[index] = metric
+                        return metric
+                    return existing
+            self.metrics.append(metric)
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, callback):
+        return self._register(Gauge(name, help, callback), replace=True)
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def _write_log(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        with self._log_lock:
+            if self.log_path == '-':
+                sys.stderr.write(line)
+                return
+            if self._log_file is None or self._log_file.name != self.log_path:
+                self._log_file = open(self.log_path, 'a', encoding='utf-8')
+            self._log_file.write(line)
+            self._log_file.flush()
+
+    def serve(self, port=9464, host='127.0.0.1'):
+        """Expose /metrics on a daemon thread; returns the server so callers can shut it down"""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = telemetry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+        return server
+
+
+# Process-wide instance shared by the analyzer, the UI and the batch CLI
+telemetry = Telemetry(log_path=os.getenv('ANALYZER_JSON_LOG'))
@@ -0,0 +1,319 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import numpy as np
+from instrumentation import telemetry
+from sqlite_store import open_database
+
+
+STATUSES = ('queued', 'running', 'done', 'failed')
+
+log = logging.getLogger(__name__)
+
+# Tokens of the queues started in this process. A restarted process can get its predecessor's PID,
+# so a running job only belongs to a live worker if its token is also one of these
+_live_tokens = set()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class JobQueue:
+    """Persistent SQLite job queue served by a pool of worker threads
+
+    Jobs outlive page reruns and are retrievable by ID until `retention` seconds after they finish.
+    The handler is called as handler(job, report) and returns a JSON-serializable result;
+    report(progress) stores an intermediate progress dict the UI can poll.
+    """
+
+    def __init__(self, path=None, handler=None, workers=4, poll_interval=1.0, retention=7 * 24 * 3600, stats_window=300):
+        self.path = path or os.getenv('JOB_QUEUE_PATH', os.path.join('.cache', 'jobs.sqlite3'))
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.stats_window = stats_window
+        self.busy_workers = 0
+        self._started_at = None
+        self._threads = []
+        self._stopping = threading.Event()
+        self._wakeup = threading.Condition()
+        # Bumped on every local submit so a worker never sleeps through a job queued while it was claiming
+        self._submissions = 0
+        self._lock = threading.Lock()
+        self.token = uuid.uuid4().hex
+        # Jobs a worker of this queue is running, and finished jobs whose outcome is still waiting to be written
+        self._running = set()
+        self._unsaved = {}
+
+        self._db = open_database(self.path)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                text TEXT,
+                data BLOB,
+                file_type TEXT,
+                name TEXT,
+                options TEXT NOT NULL,
+                progress TEXT,
+                result TEXT,
+                error TEXT,
+                metrics TEXT,
+                worker_pid INTEGER,
+                worker_token TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        """)
+        if 'worker_token' not in [column[1] for column in self._db.execute('PRAGMA table_info(jobs)')]:
+            self._db.execute('ALTER TABLE jobs ADD COLUMN worker_token TEXT')
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at)')
+        self._db.commit()
+
+        self.wait_seconds = telemetry.histogram('analyzer_job_wait_seconds', 'Time jobs spend queued before a worker starts them')
+        self.jobs = telemetry.counter('analyzer_jobs_total', 'Finished jobs by status', ('status',))
+        telemetry.gauge('analyzer_job_queue_depth', 'Jobs waiting for a worker', lambda: self._count('queued'))
+        telemetry.gauge('analyzer_job_workers_busy', 'Worker threads currently running a job', lambda: self.busy_workers)
+        telemetry.gauge('analyzer_job_workers', 'Worker threads serving the queue', lambda: len(self._threads))
+
+    def start(self):
+        self._started_at = time.time()
+        _live_tokens.add(self.token)
+        self._recover()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._save_outcomes()
+        _live_tokens.discard(self.token)
+
+    def _recover(self):
+        now = time.time()
+        with self._lock:
+            # Jobs left running by a process that has since died go back to the front of the queue. A PID equal
+            # to ours is a dead predecessor that had the same PID, unless a queue in this process is running the job
+            for job_id, pid, token in self._db.execute("SELECT id, worker_pid, worker_token FROM jobs WHERE status = 'running'").fetchall():
+                if pid is None or (pid == os.getpid() and token not in _live_tokens) or not _pid_alive(pid):
+                    self._db.execute("UPDATE jobs SET status = 'queued', started_at = NULL, worker_pid = NULL, worker_token = NULL, "
+                                     "progress = NULL WHERE id = ?", (job_id,))
+            if self.retention is not None:
+                self._db.execute('DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?', (now - self.retention,))
+            self._db.commit()
+
+    def submit(self, text=None, data=None, file_type=None, name=None, options=None):
+        """Queue a text or file job and return its ID immediately"""
+        job_id = uuid.uuid4().hex[:12]
+        kind = 'file' if data is not None else 'text'
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO jobs (id, status, kind, text, data, file_type, name, options, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, 'queued', kind, text, data, file_type, name, json.dumps(options or {}), time.time())
+            )
+            self._db.commit()
+        with self._wakeup:
+            self._submissions += 1
+            self._wakeup.notify()
+        return job_id
+
+    def _claim(self):
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two processes sharing the file never claim the same job
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute(
+                    "SELECT id, kind, text, data, file_type, name, options, created_at FROM jobs "
+                    "WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                started_at = time.time()
+                self._db.execute("UPDATE jobs SET status = 'running', started_at = ?, worker_pid = ?, worker_token = ? WHERE id = ?",
+                                 (started_at, os.getpid(), self.token, row[0]))
+                self._running.add(row[0])
+            finally:
+                self._db.commit()
+        job_id, kind, text, data, file_type, name, options, created_at = row
+        self.wait_seconds.observe(started_at - created_at)
+        return {'id': job_id, 'kind': kind, 'text': text, 'data': data, 'file_type': file_type, 'name': name,
+                'options': json.loads(options), 'created_at': created_at, 'started_at': started_at}
+
+    def _update(self, job_id, **fields):
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._lock:
+            self._db.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+            self._db.commit()
+
+    def _save_outcomes(self):
+        # Outcomes whose write failed are retried on every pass until they land, so a finished job never stays running
+        with self._lock:
+            pending = list(self._unsaved.items())
+        for job_id, fields in pending:
+            try:
+                self._update(job_id, **fields)
+            except sqlite3.Error:
+                log.exception("Could not record the outcome of job %s", job_id)
+                return
+            with self._lock:
+                self._unsaved.pop(job_id, None)
+
+    def _work(self):
+        while not self._stopping.is_set():
+            self._save_outcomes()
+            seen = self._submissions
+            try:
+                job = self._claim()
+            except sqlite3.Error:
+                # e.g. "database is locked" while another process holds the file; the worker must outlive it
+                log.exception("Could not claim a job from %s", self.path)
+                self._stopping.wait(self.poll_interval)
+                continue
+            if job is None:
+                # Submissions in this process wake a worker at once; the timeout picks up other processes' jobs
+                with self._wakeup:
+                    if self._submissions == seen and not self._stopping.is_set():
+                        self._wakeup.wait(self.poll_interval)
+                continue
+
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    self._running.discard(job['id'])
+
+    def _run(self, job):
+        with self._lock:
+            self.busy_workers += 1
+        status, result, error = 'done', None, None
+        try:
+            with telemetry.request(source='job', job_id=job['id'], input=job['kind'], file_type=job['file_type'],
+                                   wait_seconds=round(job['started_at'] - job['created_at'], 6)) as record:
+                try:
+                    result = self.handler(job, lambda progress: self._report(job['id'], progress))
+                except Exception as e:
+                    status, error = 'failed', f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+                    telemetry.annotate(error=type(e).__name__)
+        finally:
+            with self._lock:
+                self.busy_workers -= 1
+        self.jobs.inc(status=status)
+        fields = dict(
+            status=status, finished_at=time.time(), progress=None, data=None,
+            result=json.dumps(result, ensure_ascii=False) if result is not None else None,
+            error=error, metrics=json.dumps(record, ensure_ascii=False, default=str)
+        )
+        try:
+            self._update(job['id'], **fields)
+        except sqlite3.Error:
+            # Kept in memory and retried by the workers until it lands; get() serves it meanwhile. If this process
+            # dies first, the job is re-run after a restart
+            log.exception("Could not record the outcome of job %s, will retry", job['id'])
+            with self._lock:
+                self._unsaved[job['id']] = fields
+
+    def _report(self, job_id, progress):
+        # Progress is best effort; a failed write must not fail the job
+        try:
+            self._update(job_id, progress=json.dumps(progress, ensure_ascii=False))
+        except sqlite3.Error:
+            log.exception("Could not record progress of job %s", job_id)
+
+    def get(self, job_id):
+        """Status, progress, result and timings for a job, or None for an unknown (or purged) ID"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT status, kind, name, progress, result, error, metrics, created_at, started_at, finished_at, worker_token '
+                'FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            status, kind, name, progress, result, error, metrics, created_at, started_at, finished_at, token = row
+            if status == 'running' and job_id in self._unsaved:
+                unsaved = self._unsaved[job_id]
+                status, progress, result, error, metrics, finished_at = (
+                    unsaved['status'], None, unsaved['result'], unsaved['error'], unsaved['metrics'], unsaved['finished_at'])
+            elif status == 'running' and token == self.token and job_id not in self._running:
+                # Ours, but no worker has it: it would otherwise be polled forever, since _recover leaves live tokens alone
+                status, error = 'failed', "Job was lost by its worker"
+            position = None
+            if status == 'queued':
+                position = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < ?",
+                                            (created_at,)).fetchone()[0] + 1
+        return {
+            'id': job_id,
+            'status': status,
+            'kind': kind,
+            'name': name,
+            'position': position,
+            'progress': json.loads(progress) if progress else None,
+            'result': json.loads(result) if result else None,
+            'error': error,
+            'metrics': json.loads(metrics) if metrics else None,
+            'created_at': created_at,
+            'started_at': started_at,
+            'finished_at': finished_at
+        }
+
+    def _count(self, status):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (status,)).fetchone()[0]
+
+    def stats(self):
+        """Queue depth, worker utilization and wait/run time percentiles over the last stats_window seconds"""
+        now = time.time()
+        # Measure over the time workers have actually been up, so a fresh queue is not reported idle
+        window = min(self.stats_window, now - self._started_at) if self._started_at else self.stats_window
+        since = now - window
+        with self._lock:
+            counts = dict(self._db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+            oldest = self._db.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            recent = self._db.execute(
+                'SELECT created_at, started_at, finished_at FROM jobs WHERE started_at IS NOT NULL '
+                'AND (finished_at IS NULL OR finished_at >= ?)', (since,)
+            ).fetchall()
+            busy_workers = self.busy_workers
+
+        waits = np.array([started - created for created, started, _ in recent if started >= since])
+        runs = np.array([finished - started for _, started, finished in recent if finished is not None])
+        # Busy time inside the window, counting jobs still running up to now
+        busy = sum(min(finished or now, now) - max(started, since) for _, started, finished in recent)
+        workers = len(self._threads) or self.workers
+        return {
+            **{status: counts.get(status, 0) for status in STATUSES},
+            'workers': workers,
+            'busy_workers': busy_workers,
+            'utilization': busy / (workers * window) if workers and window > 0 else None,
+            'oldest_queued_seconds': now - oldest if oldest is not None else None,
+            'wait_p50': float(np.percentile(waits, 50)) if len(waits) else None,
+            'wait_p95': float(np.percentile(waits, 95)) if len(waits) else None,
+            'run_p50': float(np.percentile(runs, 50)) if len(runs) else None,
+            'run_p95': float(np.percentile(runs, 95)) if len(runs) else None
+        }
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self._db.close()
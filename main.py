@@ -1,43 +1,364 @@
+import time
+_script_started = time.perf_counter()
+
+import os
+import statistics
+import uuid
+from collections import deque
 import streamlit as st
 from ai_generated_analyzer import AIGeneratedAnalyzer
-import io
-import docx2txt
-import PyPDF2
-import pandas as pd
+from verdict_cache import VerdictCache
+from stylometry import StylometricPrescreen
+from near_duplicate_index import NearDuplicateIndex
+from extraction_cache import ExtractionCache
+from text_chunker import split_into_chunks
+from token_budget import TokenBudget
+from instrumentation import telemetry
+from backend_pool import BackendPool
+from job_queue import JobQueue
+from revision_store import RevisionStore
+
+_imports_done = time.perf_counter()
 
-def extract_text_from_file(uploaded_file):
+MIN_CHARS = 200
+
+def extract_job_text(job, extraction_cache):
     """Extract text from various file formats"""
-    file_type = uploaded_file.type
-    
+    data = job['data']
+    # Re-uploads of the same file are served from the extraction cache; large PDFs are spilled to a temp file for the workers
+    with telemetry.span('extract', bytes=len(data)):
+        text = extraction_cache.extract(data, job['file_type'], max_chars=job['options']['max_chars'] or None)['text']
+    telemetry.extracted_bytes.inc(len(data), file_type=job['file_type'])
+    telemetry.extracted_chars.inc(len(text or ''), file_type=job['file_type'])
+    telemetry.annotate(chars=len(text or ''))
+    if not text or len(text) < MIN_CHARS:
+        raise ValueError(f"Could not extract sufficient text (minimum {MIN_CHARS} characters) from the file.")
+    return text
+
+def analyze_job(job, report, analyzer, prescreen, near_duplicates, extraction_cache):
+    # Settings were captured from the sidebar at submit time, so a later rerun cannot change a queued job
+    options = job['options']
+    analyzer = analyzer.with_options(
+        token_budget=TokenBudget(**options['token_budget']),
+        prescreen=prescreen if options['prescreen'] else None,
+        prescreen_bands=options.get('prescreen_bands'),
+        near_duplicates=near_duplicates if options['near_duplicate_mode'] != "off" else None,
+        near_duplicate_mode=options['near_duplicate_mode']
+    )
+    text = extract_job_text(job, extraction_cache) if job['kind'] == 'file' else job['text']
+    # Jobs queued before incremental re-analysis existed carry no document_id
+    document_id = options.get('document_id') if options.get('incremental') else None
+    return run_analysis(analyzer, text, options['bypass_cache'], options['chunked'], options['max_chunk_tokens'], report, options['stream'], document_id)
+
+@st.cache_resource
+def get_verdict_cache():
+    # Shared across reruns and sessions so the in-memory LRU tier actually gets hits
+    return VerdictCache()
+
+@st.cache_resource
+def get_extraction_cache():
+    # Kept apart from verdicts: extracted text stays valid when the model or prompt changes
+    return ExtractionCache()
+
+@st.cache_resource
+def get_revision_store():
+    # Last analyzed revision per session/document, so a resubmitted edit only re-scores what changed
+    return RevisionStore()
+
+@st.cache_resource
+def get_prescreen():
+    # Shared so escalation counters cover every session. Local verdicts stay off until fitted weights are configured
+    params_path = os.getenv('PRESCREEN_PARAMS_PATH')
+    return StylometricPrescreen.load(params_path) if params_path else StylometricPrescreen()
+
+@st.cache_resource
+def get_near_duplicate_index():
+    return NearDuplicateIndex()
+
+@st.cache_resource
+def get_analyzer():
+    # One analyzer (and pooled HTTP client) per process, shared by every session and rerun
+    started = time.perf_counter()
+    # ANALYZER_BACKENDS lists several OpenAI-compatible endpoints to route, hedge and fail over between
+    analyzer = AIGeneratedAnalyzer(cache=get_verdict_cache(), prescreen=get_prescreen(), near_duplicates=get_near_duplicate_index(),
+                                   backends=BackendPool.from_env(), revisions=get_revision_store())
+    get_run_timings()['analyzer_init'] = time.perf_counter() - started
+    return analyzer
+
+@st.cache_resource
+def get_job_queue():
+    # Workers live as long as the process, so a job keeps running when its page reruns or closes
+    analyzer, prescreen, near_duplicates = get_analyzer(), get_prescreen(), get_near_duplicate_index()
+    extraction_cache = get_extraction_cache()
+    return JobQueue(
+        handler=lambda job, report: analyze_job(job, report, analyzer, prescreen, near_duplicates, extraction_cache),
+        workers=int(os.getenv('ANALYZER_JOB_WORKERS', '4'))
+    ).start()
+
+@st.cache_resource
+def get_metrics_server():
+    # Prometheus scrape endpoint for this process; ANALYZER_METRICS_PORT=0 turns it off
+    port = int(os.getenv('ANALYZER_METRICS_PORT', '9464'))
+    if not port:
+        return None
     try:
-        if 'text/plain' in file_type:
-            # Text files
-            return uploaded_file.getvalue().decode('utf-8')
+        return telemetry.serve(port, host=os.getenv('ANALYZER_METRICS_HOST', '127.0.0.1'))
+    except OSError:
+        # Another app process already owns the port
+        return None
+
+@st.cache_resource
+def get_run_timings():
+    return {'cold_start': None, 'imports': None, 'analyzer_init': None, 'reruns': deque(maxlen=200)}
+
+def record_run_timing(imports, total):
+    timings = get_run_timings()
+    # The first script run in this process is the cold start; every later one is a rerun
+    if timings['cold_start'] is None:
+        timings['cold_start'] = total
+        timings['imports'] = imports
+    else:
+        timings['reruns'].append(total)
+
+def render_timing_report():
+    timings = get_run_timings()
+    with st.sidebar.expander("Performance"):
+        if timings['cold_start'] is None:
+            st.caption("Timings are recorded from the next interaction.")
+            return
+        st.caption(f"Cold start: {timings['cold_start'] * 1000:.0f} ms (imports {timings['imports'] * 1000:.0f} ms)")
+        if timings['analyzer_init'] is not None:
+            st.caption(f"Analyzer init (once per process): {timings['analyzer_init'] * 1000:.0f} ms")
+        reruns = list(timings['reruns'])
+        if reruns:
+            st.caption(f"Reruns: {len(reruns)} · last {reruns[-1] * 1000:.0f} ms · median {statistics.median(reruns) * 1000:.0f} ms · max {max(reruns) * 1000:.0f} ms")
+        server = get_metrics_server()
+        if server is not None:
+            host, port = server.server_address[:2]
+            st.caption(f"Metrics: http://{host}:{port}/metrics")
+        last = st.session_state.get('last_request')
+        if last:
+            stages = " · ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in last['stages'].items())
+            st.caption(f"Last analysis ({last.get('cache_status', 'n/a')}): {last['seconds'] * 1000:.0f} ms — {stages}")
+
+def run_analysis(analyzer, text, bypass_cache=False, chunked=True, max_chunk_tokens=1500, report=None, stream=True, document_id=None):
+    def on_chunk(chunk_result, done, total):
+        if report is not None:
+            report({'done': done, 'total': total})
+
+    multi_chunk = chunked and len(split_into_chunks(text, max_tokens=max_chunk_tokens)) > 1
+    # Sections are only worth it for long texts or once there is an earlier revision to reuse; a short first
+    # submission keeps the streamed single-request path
+    if chunked and document_id is not None and (multi_chunk or analyzer.has_revision(document_id)):
+        return analyzer.analyze_revision(text, document_id, max_chunk_tokens=max_chunk_tokens, bypass_cache=bypass_cache, on_chunk=on_chunk)
+
+    if multi_chunk:
+        return analyzer.analyze_chunked(text, max_chunk_tokens=max_chunk_tokens, bypass_cache=bypass_cache, on_chunk=on_chunk)
+
+    if not stream or report is None:
+        return analyzer.analyze_text(text, bypass_cache=bypass_cache)
+
+    # Publish the partial result as each line of the reply arrives: score first, then conclusion, then patterns
+    partial = {'score': None, 'conclusion': None, 'patterns': []}
+    for kind, value in analyzer.analyze_text_stream(text, bypass_cache=bypass_cache):
+        if kind == 'done':
+            return value
+        if kind == 'pattern':
+            partial['patterns'].append(value)
+        else:
+            partial[kind] = value
+        report({'partial': partial})
+
+def render_job_status(job):
+    if job['status'] == 'queued':
+        st.info(f"Job {job['id']} is queued (position {job['position']}). You can leave this page and look it up later by ID.")
+        return
+    progress = job['progress'] or {}
+    if 'total' in progress:
+        st.progress(progress['done'] / progress['total'], text=f"Analyzed section {progress['done']} of {progress['total']}")
+    elif 'partial' in progress:
+        render_result(progress['partial'], streaming=True)
+    else:
+        st.info("Analyzing... Please wait.")
+    st.caption(f"Job {job['id']}")
+
+@st.fragment(run_every=1.0)
+def poll_job(job_id):
+    # Only this panel reruns while the job is pending; the whole app reruns once it has finished
+    job = get_job_queue().get(job_id)
+    if job is None or job['status'] not in ('queued', 'running'):
+        st.rerun()
+    with telemetry.span('render'):
+        render_job_status(job)
+
+def render_results_panel(job_queue):
+    job_id = st.session_state.get('job_id')
+    job = job_queue.get(job_id) if job_id else None
+    if job is not None and job['status'] in ('queued', 'running'):
+        poll_job(job_id)
+        return
+
+    if job_id and job is None:
+        st.warning(f"No job with ID {job_id} (finished jobs are kept for 7 days).")
+    elif job is not None and job['status'] == 'failed':
+        st.error(f"Analysis failed: {job['error']}")
+    elif job is not None and st.session_state.get('result_job_id') != job_id:
+        st.session_state.result = job['result']
+        st.session_state.result_job_id = job_id
+        st.session_state.last_request = job['metrics']
+    with telemetry.span('render'):
+        render_result(st.session_state.get('result', None) if job is None or job['status'] == 'done' else None)
+    if job is not None:
+        st.caption(f"Job {job_id}")
+
+def render_chunk_strip(chunks):
+    # One colored cell per section so reviewers can see where generated text is concentrated
+    total_chars = sum(chunk['chars'] for chunk in chunks) or 1
+    cells = ""
+    for chunk in chunks:
+        score = chunk['score']
+        color = "#a0aec0" if score is None else "#e53e3e" if score > 70 else "#dd6b20" if score > 40 else "#38a169"
+        label = "?" if score is None else score
+        cells += f"""<div title="Section {chunk['index'] + 1}: {label}/100 ({chunk['chars']} chars)" style="flex: {chunk['chars'] / total_chars:.4f} 1 0; min-width: 28px; background-color: {color}; color: white; font-size: 0.75rem; font-weight: 600; text-align: center; padding: 0.4rem 0;">{label}</div>"""
+    st.markdown(f"""
+    <div style="margin: 1rem 0;">
+        <div style="font-weight: 600; color: #4a5568; margin-bottom: 0.4rem;">Section Scores ({len(chunks)} sections)</div>
+        <div style="display: flex; gap: 2px; border-radius: 8px; overflow: hidden;">{cells}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+def render_result(result, streaming=False):
+    if result and result['score'] is None and streaming:
+        st.info("Waiting for the first tokens from the model...")
+        return
+    if result:
+        score_col, conclusion_col = st.columns([1, 2])
+        with score_col:
+            gauge_color = "red" if result['score'] > 70 else "orange" if result['score'] > 40 else "green"
+            st.markdown(f"""
+            <div style="text-align: center; padding: 0.5rem;">
+                <h4 style="margin-bottom: 0.5rem; font-size: 1.1rem; color: #64748b;">AI Score</h4>
+                <div style="position: relative; width: 150px; height: 150px; margin: 0 auto; border-radius: 50%; background: conic-gradient({gauge_color} {result['score']}%, #e2e8f0 0); display: flex; align-items: center; justify-content: center; box-shadow: 0 4px 12px rgba(0,0,0,0.1);">
+                    <div style="width: 120px; height: 120px; background: white; border-radius: 50%; display: flex; align-items: center; justify-content: center;">
+                        <div style="font-size: 2.5rem; font-weight: bold; color: {gauge_color}; text-shadow: 0 2px 4px rgba(0,0,0,0.05);">
+                            {result['score']}
+                        </div>
+                    </div>
+                </div>
+                <div style="margin-top: 1rem; font-size: 0.9rem; color: #64748b;">
+                    Score out of 100
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
             
-        elif 'application/pdf' in file_type:
-            # PDF files
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(uploaded_file.getvalue()))
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+        with conclusion_col:
+            conclusion_class = "ai-generated" if result['score'] > 70 else "human-written"
+            conclusion_icon = "🤖" if result['score'] > 70 else "👨‍💻"
+            conclusion_title = "AI-Generated Content" if result['score'] > 70 else "Human-Written Content"
+            confidence_level = "High" if result['score'] > 85 or result['score'] < 15 else "Medium" if result['score'] > 70 or result['score'] < 30 else "Moderate"
             
-        elif 'application/vnd.openxmlformats-officedocument.wordprocessingml.document' in file_type:
-            # DOCX files
-            return docx2txt.process(io.BytesIO(uploaded_file.getvalue()))
+            st.markdown(f"""
+            <div class="score-box {conclusion_class}">
+                <h3 style="margin-top: 0; display: flex; align-items: center; font-size: 1.6rem;">
+                    <span style="margin-right: 0.5rem; font-size: 1.8rem;">{conclusion_icon}</span> 
+                    {conclusion_title}
+                </h3>
+                <div style="margin-top: 0.5rem; padding-top: 0.5rem; border-top: 1px solid rgba(0,0,0,0.05);">
+                    <span style="font-weight: 600; color: #4a5568;">Confidence:</span> 
+                    <span style="display: inline-block; padding: 0.2rem 0.6rem; border-radius: 1rem; font-size: 0.85rem; font-weight: 600; background-color: {'rgba(229, 62, 62, 0.1)' if result['score'] > 70 else 'rgba(56, 161, 105, 0.1)'}; color: {'#e53e3e' if result['score'] > 70 else '#38a169'};">{confidence_level}</span>
+                </div>
+                <p style="margin-top: 0.8rem; color: #4a5568; line-height: 1.5;">
+                    {result['conclusion'] if result['conclusion'] is not None else '…'}
+                </p>
+            </div>
+            """, unsafe_allow_html=True)
             
-        elif 'application/vnd.ms-excel' in file_type or 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet' in file_type:
-            # Excel files
-            df = pd.read_excel(io.BytesIO(uploaded_file.getvalue()))
-            return df.to_string()
+        if result.get('near_duplicate'):
+            match = result['near_duplicate']
+            st.warning(f"Near-duplicate of earlier submission #{match['match_id']} ({match['similarity']:.0%} similar).")
+
+        if result.get('source') == 'prescreen':
+            st.info("Verdict from the local stylometric pre-screen; the model was not called.")
+
+        if result.get('chunks'):
+            render_chunk_strip(result['chunks'])
+
+        revision = result.get('revision')
+        if revision and revision['sections_reanalyzed'] < revision['sections']:
+            st.caption(f"Incremental re-analysis: since the last submission {revision['paragraphs_edited']} paragraphs were edited, "
+                       f"{revision['paragraphs_added']} added and {revision['paragraphs_removed']} removed; "
+                       f"re-scored {revision['sections_reanalyzed']} of {revision['sections']} sections and reused the rest.")
+
+        st.subheader("Detection Patterns")
+        if result['patterns']:
+            st.markdown("""
+            <div style="margin-bottom: 1rem; padding: 0.8rem; background-color: #f7fafc; border-radius: 8px; font-size: 0.9rem; color: #4a5568;">
+                The following patterns were detected in the analyzed content. Each pattern contributes to the overall AI score.
+            </div>
+            """, unsafe_allow_html=True)
             
+            for pattern in result['patterns']:
+                confidence_color = {
+                    "High": "#e53e3e",
+                    "Medium": "#dd6b20",
+                    "Low": "#d69e2e"
+                }.get(pattern['confidence'], "#718096")
+                
+                confidence_bg = {
+                    "High": "rgba(229, 62, 62, 0.1)",
+                    "Medium": "rgba(221, 107, 32, 0.1)",
+                    "Low": "rgba(214, 158, 46, 0.1)"
+                }.get(pattern['confidence'], "rgba(113, 128, 150, 0.1)")
+                
+                confidence_icon = {
+                    "High": "🔴",
+                    "Medium": "🟠",
+                    "Low": "🟡"
+                }.get(pattern['confidence'], "⚪")
+                
+                with st.expander(f"{confidence_icon} {pattern['pattern']}"):
+                    st.markdown(f"""
+                    <div class="pattern-box">
+                        <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 0.8rem;">
+                            <div style="font-weight: 600; color: #2d3748; font-size: 1.05rem;">{pattern['pattern']}</div>
+                            <div style="padding: 0.2rem 0.8rem; border-radius: 1rem; font-size: 0.8rem; font-weight: 600; background-color: {confidence_bg}; color: {confidence_color};">
+                                {pattern['confidence']} Confidence
+                            </div>
+                        </div>
+                        <p style="color: #4a5568; line-height: 1.6; margin-top: 0.5rem;">{pattern['description']}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+            if streaming:
+                st.caption("Receiving more patterns...")
+        elif streaming:
+            st.caption("Waiting for detected patterns...")
         else:
-            return None
-    except Exception as e:
-        st.error(f"Error processing file: {str(e)}")
-        return None
+            st.markdown("""
+            <div style="padding: 1.5rem; text-align: center; background-color: #f7fafc; border-radius: 8px; color: #4a5568; border: 1px dashed #cbd5e0;">
+                <div style="font-size: 2.5rem; margin-bottom: 0.5rem;">🔍</div>
+                <div style="font-weight: 600; margin-bottom: 0.5rem;">No Significant Patterns Detected</div>
+                <p style="color: #718096; font-size: 0.9rem;">The analysis did not find any significant AI-generated content patterns in the text.</p>
+            </div>
+            """, unsafe_allow_html=True)
+    else:
+        st.markdown("""
+        <div style="padding: 2rem 1rem; text-align: center; height: 100%;">
+            <div style="font-size: 4rem; color: #a0aec0; margin-bottom: 1.5rem;">📊</div>
+            <h3 style="color: #4a5568; margin-bottom: 1rem; font-weight: 600;">No Analysis Results Yet</h3>
+            <p style="color: #718096; max-width: 400px; margin: 0 auto; line-height: 1.6;">
+                Enter text or upload a file on the left panel to analyze and detect whether content was created by AI or written by a human.
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
 
 def main():
+    try:
+        render_app()
+    finally:
+        # Also runs when st.rerun() interrupts the script, so every run is measured
+        record_run_timing(_imports_done - _script_started, time.perf_counter() - _script_started)
+
+def render_app():
     st.set_page_config(page_title="AI Content Detector", page_icon="🧠", layout="wide")
     
     # Modern UI styling
@@ -308,126 +629,131 @@ def main():
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.subheader("Analysis Results")
 
-        result = st.session_state.get('result', None)
-        if result:
-            score_col, conclusion_col = st.columns([1, 2])
-            with score_col:
-                gauge_color = "red" if result['score'] > 70 else "orange" if result['score'] > 40 else "green"
-                st.markdown(f"""
-                <div style="text-align: center; padding: 0.5rem;">
-                    <h4 style="margin-bottom: 0.5rem; font-size: 1.1rem; color: #64748b;">AI Score</h4>
-                    <div style="position: relative; width: 150px; height: 150px; margin: 0 auto; border-radius: 50%; background: conic-gradient({gauge_color} {result['score']}%, #e2e8f0 0); display: flex; align-items: center; justify-content: center; box-shadow: 0 4px 12px rgba(0,0,0,0.1);">
-                        <div style="width: 120px; height: 120px; background: white; border-radius: 50%; display: flex; align-items: center; justify-content: center;">
-                            <div style="font-size: 2.5rem; font-weight: bold; color: {gauge_color}; text-shadow: 0 2px 4px rgba(0,0,0,0.05);">
-                                {result['score']}
-                            </div>
-                        </div>
-                    </div>
-                    <div style="margin-top: 1rem; font-size: 0.9rem; color: #64748b;">
-                        Score out of 100
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-            with conclusion_col:
-                conclusion_class = "ai-generated" if result['score'] > 70 else "human-written"
-                conclusion_icon = "🤖" if result['score'] > 70 else "👨‍💻"
-                conclusion_title = "AI-Generated Content" if result['score'] > 70 else "Human-Written Content"
-                confidence_level = "High" if result['score'] > 85 or result['score'] < 15 else "Medium" if result['score'] > 70 or result['score'] < 30 else "Moderate"
-                
-                st.markdown(f"""
-                <div class="score-box {conclusion_class}">
-                    <h3 style="margin-top: 0; display: flex; align-items: center; font-size: 1.6rem;">
-                        <span style="margin-right: 0.5rem; font-size: 1.8rem;">{conclusion_icon}</span> 
-                        {conclusion_title}
-                    </h3>
-                    <div style="margin-top: 0.5rem; padding-top: 0.5rem; border-top: 1px solid rgba(0,0,0,0.05);">
-                        <span style="font-weight: 600; color: #4a5568;">Confidence:</span> 
-                        <span style="display: inline-block; padding: 0.2rem 0.6rem; border-radius: 1rem; font-size: 0.85rem; font-weight: 600; background-color: {'rgba(229, 62, 62, 0.1)' if result['score'] > 70 else 'rgba(56, 161, 105, 0.1)'}; color: {'#e53e3e' if result['score'] > 70 else '#38a169'};">{confidence_level}</span>
-                    </div>
-                    <p style="margin-top: 0.8rem; color: #4a5568; line-height: 1.5;">
-                        {result['conclusion']}
-                    </p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-            st.subheader("Detection Patterns")
-            if result['patterns']:
-                st.markdown("""
-                <div style="margin-bottom: 1rem; padding: 0.8rem; background-color: #f7fafc; border-radius: 8px; font-size: 0.9rem; color: #4a5568;">
-                    The following patterns were detected in the analyzed content. Each pattern contributes to the overall AI score.
-                </div>
-                """, unsafe_allow_html=True)
-                
-                for pattern in result['patterns']:
-                    confidence_color = {
-                        "High": "#e53e3e",
-                        "Medium": "#dd6b20",
-                        "Low": "#d69e2e"
-                    }.get(pattern['confidence'], "#718096")
-                    
-                    confidence_bg = {
-                        "High": "rgba(229, 62, 62, 0.1)",
-                        "Medium": "rgba(221, 107, 32, 0.1)",
-                        "Low": "rgba(214, 158, 46, 0.1)"
-                    }.get(pattern['confidence'], "rgba(113, 128, 150, 0.1)")
-                    
-                    confidence_icon = {
-                        "High": "🔴",
-                        "Medium": "🟠",
-                        "Low": "🟡"
-                    }.get(pattern['confidence'], "⚪")
-                    
-                    with st.expander(f"{confidence_icon} {pattern['pattern']}"):
-                        st.markdown(f"""
-                        <div class="pattern-box">
-                            <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 0.8rem;">
-                                <div style="font-weight: 600; color: #2d3748; font-size: 1.05rem;">{pattern['pattern']}</div>
-                                <div style="padding: 0.2rem 0.8rem; border-radius: 1rem; font-size: 0.8rem; font-weight: 600; background-color: {confidence_bg}; color: {confidence_color};">
-                                    {pattern['confidence']} Confidence
-                                </div>
-                            </div>
-                            <p style="color: #4a5568; line-height: 1.6; margin-top: 0.5rem;">{pattern['description']}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-            else:
-                st.markdown("""
-                <div style="padding: 1.5rem; text-align: center; background-color: #f7fafc; border-radius: 8px; color: #4a5568; border: 1px dashed #cbd5e0;">
-                    <div style="font-size: 2.5rem; margin-bottom: 0.5rem;">🔍</div>
-                    <div style="font-weight: 600; margin-bottom: 0.5rem;">No Significant Patterns Detected</div>
-                    <p style="color: #718096; font-size: 0.9rem;">The analysis did not find any significant AI-generated content patterns in the text.</p>
-                </div>
-                """, unsafe_allow_html=True)
-        else:
-            st.markdown("""
-            <div style="padding: 2rem 1rem; text-align: center; height: 100%;">
-                <div style="font-size: 4rem; color: #a0aec0; margin-bottom: 1.5rem;">📊</div>
-                <h3 style="color: #4a5568; margin-bottom: 1rem; font-weight: 600;">No Analysis Results Yet</h3>
-                <p style="color: #718096; max-width: 400px; margin: 0 auto; line-height: 1.6;">
-                    Enter text or upload a file on the left panel to analyze and detect whether content was created by AI or written by a human.
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
+        job_queue = get_job_queue()
+        render_results_panel(job_queue)
             
         st.markdown("</div>", unsafe_allow_html=True)
 
-    # Initialize analyzer once
-    analyzer = AIGeneratedAnalyzer()
+    with st.sidebar:
+        st.subheader("Local Pre-screen")
+        prescreen = get_prescreen()
+        use_prescreen = st.checkbox("Skip the model for clear-cut cases", value=False, disabled=not prescreen.calibrated,
+                                    help=None if prescreen.calibrated else "Set PRESCREEN_PARAMS_PATH to weights fitted with StylometricPrescreen.fit() to enable")
+        # Bands belong to this session; the shared pre-screen keeps its own defaults for everyone else
+        prescreen_bands = st.slider("Escalate pre-scores between", 0, 100, (prescreen.human_below, prescreen.ai_above))
+        prescreen_stats = prescreen.stats()
+        if prescreen_stats['screened']:
+            st.caption(f"Screened: {prescreen_stats['screened']} · Local human: {prescreen_stats['local_human']} · Local AI: {prescreen_stats['local_ai']} · Escalation rate: {prescreen_stats['escalation_rate']:.0%}")
+
+        st.subheader("Token Budget")
+        deployment_budget = TokenBudget.from_env()
+        max_input_tokens = st.number_input("Max prompt tokens per request", min_value=500, max_value=120000, value=deployment_budget.max_input_tokens, step=500)
+        expected_patterns = st.slider("Expected patterns (sizes max_tokens)", 1, 20, deployment_budget.expected_patterns)
+        token_budget = TokenBudget(
+            max_input_tokens=max_input_tokens,
+            expected_patterns=expected_patterns,
+            tokens_per_pattern=deployment_budget.tokens_per_pattern,
+            base_output_tokens=deployment_budget.base_output_tokens,
+            max_output_tokens=deployment_budget.max_output_tokens,
+            sample_tokens=deployment_budget.sample_tokens
+        )
+
+        st.subheader("Near-Duplicates")
+        near_duplicate_mode = st.radio(
+            "Lightly edited resubmissions",
+            ["reuse", "flag", "off"],
+            format_func={"reuse": "Reuse earlier verdict", "flag": "Flag and re-analyze", "off": "Ignore"}.get
+        )
+
+    # Initialize analyzer once per process; per-session settings are a cheap view over it
+    analyzer = get_analyzer().with_options(
+        token_budget=token_budget,
+        prescreen=prescreen if use_prescreen else None,
+        prescreen_bands=prescreen_bands,
+        near_duplicates=get_near_duplicate_index() if near_duplicate_mode != "off" else None,
+        near_duplicate_mode=near_duplicate_mode
+    )
+
+    with st.sidebar:
+        st.subheader("Verdict Cache")
+        bypass_cache = st.checkbox("Bypass cache (force fresh analysis)", value=False)
+        stats = analyzer.cache_stats()
+        if stats:
+            st.caption(f"Hits: {stats['hits']} (memory {stats['memory_hits']}, disk {stats['disk_hits']}) · Misses: {stats['misses']} · Hit rate: {stats['hit_rate']:.0%}")
+            st.caption(f"Stored verdicts: {stats['disk_items']}")
+
+        usage = analyzer.usage_stats()
+        if usage['requests']:
+            st.caption(f"Model requests: {usage['requests']} · Prompt tokens: {usage['prompt_tokens']:,} · Completion tokens: {usage['completion_tokens']:,}")
+            if usage['estimate_ratio'] is not None:
+                st.caption(f"Pre-flight estimate / billed prompt tokens: {usage['estimate_ratio']:.2f} · Output budget used: {usage['output_budget_used']:.0%}")
+            if usage['prompt_cache_hit_rate'] is not None:
+                st.caption(f"Prompt template {analyzer.prompt_template.id} · Provider prefix cache: "
+                           f"{usage['prompt_cache_hit_tokens']:,} hit / {usage['prompt_cache_miss_tokens']:,} miss tokens ({usage['prompt_cache_hit_rate']:.0%})")
+
+        backend_stats = analyzer.backend_stats()
+        if len(backend_stats['backends']) > 1:
+            st.subheader("Backends")
+            st.caption(f"Hedged: {backend_stats['hedges']} of {backend_stats['requests']} ({backend_stats['hedge_rate']:.1%}) · Hedge won: {backend_stats['hedge_wins']}")
+            for backend in backend_stats['backends']:
+                latency = f"p50 {backend['p50']:.2f}s · p95 {backend['p95']:.2f}s" if backend['p50'] is not None else "no samples yet"
+                st.caption(f"{backend['name']} ({backend['breaker']}): {backend['requests']} calls · {backend['errors']} errors · {latency}")
+
+        st.subheader("Long Documents")
+        chunked = st.checkbox("Analyze long documents in sections", value=True)
+        max_chunk_tokens = st.number_input("Max tokens per section", min_value=300, max_value=8000, value=1500, step=100)
+        stream = st.checkbox("Stream results as they are generated", value=True)
+        incremental = st.checkbox("Re-analyze only edited sections when resubmitting", value=True)
+        revision_stats = analyzer.revision_stats()
+        if revision_stats and revision_stats['sections_reused']:
+            st.caption(f"Sections reused from earlier revisions: {revision_stats['sections_reused']} of "
+                       f"{revision_stats['sections_reused'] + revision_stats['sections_analyzed']} ({revision_stats['reuse_rate']:.0%})")
+        max_chars = st.number_input("Max characters extracted from files (0 = no limit)", min_value=0, value=500000, step=50000)
+        extraction_stats = get_extraction_cache().stats()
+        if extraction_stats['hits'] or extraction_stats['misses']:
+            st.caption(f"Extraction cache: {extraction_stats['hits']} hits · {extraction_stats['misses']} misses · "
+                       f"{extraction_stats['items']} files in {extraction_stats['bytes'] / 1e6:.1f} MB · "
+                       f"{extraction_stats['saved_seconds']:.1f}s of parsing saved")
+
+    with st.sidebar:
+        st.subheader("Job Queue")
+        queue_stats = job_queue.stats()
+        st.caption(f"Queued: {queue_stats['queued']} · Running: {queue_stats['running']} · Workers busy: {queue_stats['busy_workers']}/{queue_stats['workers']}"
+                   + (f" · Utilization: {queue_stats['utilization']:.0%}" if queue_stats['utilization'] is not None else ""))
+        if queue_stats['wait_p50'] is not None:
+            st.caption(f"Wait p50 {queue_stats['wait_p50']:.1f}s · p95 {queue_stats['wait_p95']:.1f}s"
+                       + (f" · Run p50 {queue_stats['run_p50']:.1f}s · p95 {queue_stats['run_p95']:.1f}s" if queue_stats['run_p50'] is not None else ""))
+        if queue_stats['oldest_queued_seconds'] is not None:
+            st.caption(f"Oldest queued job has waited {queue_stats['oldest_queued_seconds']:.0f}s")
+        st.text_input("Retrieve results by job ID", key="job_lookup", on_change=lambda: st.session_state.update(job_id=st.session_state.job_lookup.strip() or None))
+
+    get_metrics_server()
+    render_timing_report()
+
+    # Everything a worker needs to reproduce this session's settings, captured at submit time
+    options = {
+        'token_budget': vars(token_budget),
+        'prescreen': use_prescreen,
+        'prescreen_bands': list(prescreen_bands),
+        'near_duplicate_mode': near_duplicate_mode,
+        'bypass_cache': bypass_cache,
+        'chunked': chunked,
+        'max_chunk_tokens': max_chunk_tokens,
+        'stream': stream,
+        'max_chars': max_chars,
+        'incremental': incremental,
+        # One document per session, so pasting an edited version diffs against the last one analyzed
+        'document_id': st.session_state.setdefault('document_id', uuid.uuid4().hex[:12])
+    }
 
     # Process text input form
     if 'analyze_text_button' in locals() and analyze_text_button:
-        if len(text_input) < 200:
-            st.error("Please input at least 200 characters for accurate analysis.")
+        if len(text_input) < MIN_CHARS:
+            st.error(f"Please input at least {MIN_CHARS} characters for accurate analysis.")
             st.session_state.result = None
         else:
-            with st.spinner("Analyzing text... Please wait."):
-                try:
-                    result = analyzer.analyze_text(text_input)
-                    st.session_state.result = result
-                    st.rerun()
-                except Exception as e:
-                    st.session_state.result = None
-                    st.error(f"Analysis failed: {str(e)}")
+            st.session_state.job_id = job_queue.submit(text=text_input, options=options)
+            st.rerun()
 
     # Process file upload form
     if 'analyze_file_button' in locals() and analyze_file_button:
@@ -435,19 +761,10 @@ def main():
             st.error("Please upload a file first.")
             st.session_state.result = None
         else:
-            with st.spinner("Processing file and analyzing content... Please wait."):
-                extracted_text = extract_text_from_file(uploaded_file)
-                if extracted_text and len(extracted_text) >= 200:
-                    try:
-                        result = analyzer.analyze_text(extracted_text)
-                        st.session_state.result = result
-                        st.rerun()
-                    except Exception as e:
-                        st.session_state.result = None
-                        st.error(f"Analysis failed: {str(e)}")
-                else:
-                    st.error("Could not extract sufficient text (minimum 200 characters) from the file.")
-                    st.session_state.result = None
+            # Extraction runs in the worker too, so the page is free as soon as the upload is queued
+            st.session_state.job_id = job_queue.submit(data=uploaded_file.getvalue(), file_type=uploaded_file.type, name=uploaded_file.name,
+                                                       options=dict(options, document_id=f"{options['document_id']}:{uploaded_file.name}"))
+            st.rerun()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+import numpy as np
+from verdict_cache import normalize_text
+from sqlite_store import open_database
+
+
+_TOKEN_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]|\w+')
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32, so a*x + b fits in uint64 for 32-bit a, b, x
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+# Shingles hashed per block, bounding the (num_perm x block) intermediate for very long texts
+_BLOCK = 4096
+
+
+def shingles(text, size=5):
+    """32-bit hashes of overlapping token n-grams of the normalized text"""
+    tokens = _TOKEN_RE.findall(normalize_text(text).lower())
+    if len(tokens) < size:
+        tokens = [' '.join(tokens)]
+        size = 1
+    return np.fromiter(
+        (zlib.crc32(' '.join(tokens[i:i + size]).encode('utf-8')) for i in range(len(tokens) - size + 1)),
+        dtype=np.uint64
+    )
+
+
+def optimal_bands(threshold, num_perm, false_negative_weight=0.8):
+    """Pick (bands, rows) minimizing the weighted false positive + false negative area around the threshold
+
+    Missed duplicates cost a paid model call while false candidates only cost a signature
+    comparison, so false negatives are weighted more heavily by default.
+    """
+    xs, step = np.linspace(0, 1, 1001, retstep=True)
+    below = xs < threshold
+    best, best_error = None, None
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        p = 1 - (1 - xs ** rows) ** bands
+        error = ((1 - false_negative_weight) * p[below].sum() + false_negative_weight * (1 - p[~below]).sum()) * step
+        if best_error is None or error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class NearDuplicateIndex:
+    """Persistent MinHash + LSH index mapping lightly edited resubmissions to earlier verdicts"""
+
+    def __init__(self, path=None, threshold=0.8, num_perm=128, shingle_size=5, seed=1):
+        self.path = path or os.getenv('NEAR_DUPLICATE_INDEX_PATH', os.path.join('.cache', 'near_duplicates.sqlite3'))
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)[:, None]
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)[:, None]
+        self._lock = threading.Lock()
+
+        self._db = open_database(self.path)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                signature BLOB NOT NULL,
+                verdict TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                variant TEXT
+            )
+        """)
+        # Indexes created before verdicts were tagged with their model/prompt/temperature; those rows never match
+        if 'variant' not in [column[1] for column in self._db.execute('PRAGMA table_info(documents)')]:
+            self._db.execute('ALTER TABLE documents ADD COLUMN variant TEXT')
+        # Clustered on the bucket key so a query is one index probe per band
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                bucket INTEGER NOT NULL,
+                doc_id INTEGER NOT NULL,
+                PRIMARY KEY (bucket, doc_id)
+            ) WITHOUT ROWID
+        """)
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        config = json.dumps({'num_perm': num_perm, 'bands': self.bands, 'shingle_size': shingle_size, 'seed': seed})
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'config'").fetchone()
+        if row is None:
+            self._db.execute("INSERT INTO meta (key, value) VALUES ('config', ?)", (config,))
+        elif row[0] != config:
+            raise ValueError(f"Index at {self.path} was built with {row[0]}, not {config}")
+        self._db.commit()
+
+    def signature(self, text):
+        x = shingles(text, self.shingle_size)
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(x), _BLOCK):
+            hashed = ((self._a * x[None, start:start + _BLOCK] + self._b) % _PRIME) & _MAX_HASH
+            np.minimum(signature, hashed.min(axis=1), out=signature)
+        return signature.astype(np.uint32)
+
+    def _bucket_keys(self, signature):
+        keys = []
+        for band in range(self.bands):
+            digest = hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(),
+                                     digest_size=8, key=band.to_bytes(2, 'big')).digest()
+            keys.append(int.from_bytes(digest, 'big', signed=True))
+        return keys
+
+    def query(self, text, min_similarity=None, signature=None, variant=None):
+        """Best earlier match at or above min_similarity as {'match_id', 'similarity', 'verdict'}, or None
+
+        Only verdicts added with the same variant (see verdict_cache.make_variant_key) are considered.
+        """
+        min_similarity = self.threshold if min_similarity is None else min_similarity
+        signature = self.signature(text) if signature is None else signature
+        keys = self._bucket_keys(signature)
+        with self._lock:
+            rows = self._db.execute(
+                f"""SELECT id, signature, verdict FROM documents WHERE id IN (
+                        SELECT doc_id FROM buckets WHERE bucket IN ({','.join('?' * len(keys))})) AND variant IS ?""",
+                keys + [variant]
+            ).fetchall()
+        best = None
+        for doc_id, blob, verdict in rows:
+            # The fraction of equal MinHash slots estimates Jaccard similarity of the shingle sets
+            similarity = float((np.frombuffer(blob, dtype=np.uint32) == signature).mean())
+            if similarity >= min_similarity and (best is None or similarity > best['similarity']):
+                best = {'match_id': doc_id, 'similarity': similarity, 'verdict': verdict}
+        if best is not None:
+            best['verdict'] = json.loads(best['verdict'])
+        return best
+
+    def add(self, text, verdict, signature=None, variant=None):
+        signature = self.signature(text) if signature is None else signature
+        with self._lock:
+            cursor = self._db.execute(
+                'INSERT INTO documents (signature, verdict, created_at, variant) VALUES (?, ?, ?, ?)',
+                (signature.tobytes(), json.dumps(verdict, ensure_ascii=False), time.time(), variant)
+            )
+            doc_id = cursor.lastrowid
+            self._db.executemany(
+                'INSERT OR IGNORE INTO buckets (bucket, doc_id) VALUES (?, ?)',
+                [(key, doc_id) for key in self._bucket_keys(signature)]
+            )
+            self._db.commit()
+        return doc_id
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,138 @@
+import os
+from string import Formatter
+
+
+class PromptTemplate:
+    """A versioned system + user prompt; results and verdict cache keys are traceable to its id"""
+
+    def __init__(self, name, version, system, user):
+        self.name = name
+        self.version = version
+        self.system = system
+        self.user = user
+
+    @property
+    def id(self):
+        return f"{self.name}@v{self.version}"
+
+    @property
+    def prefix(self):
+        """Static text sent ahead of the first variable field, the part a provider prefix cache can reuse"""
+        literal = next(Formatter().parse(self.user), ('', None))[0]
+        return self.system + literal
+
+    @property
+    def prefix_share(self):
+        """Fraction of the static prompt text that comes before the first variable field"""
+        static = sum(len(literal) for literal, _, _, _ in Formatter().parse(self.user))
+        return len(self.prefix) / (len(self.system) + static)
+
+    @property
+    def fingerprint(self):
+        # What the verdict cache keys on; version 1 matches keys written before templates were versioned
+        return self.system + self.user
+
+    def messages(self, **fields):
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user.format(**fields)}
+        ]
+
+
+TEMPLATES = {}
+
+
+def register(template):
+    key = (template.name, template.version)
+    if key in TEMPLATES:
+        raise ValueError(f"Prompt template {template.id} is already registered")
+    TEMPLATES[key] = template
+    return template
+
+
+def get_template(name, version=None):
+    """Template by name, pinned by version, 'name@vN', ANALYZER_PROMPT_VERSION_<NAME>, or else the latest"""
+    if isinstance(name, PromptTemplate):
+        return name
+    if '@v' in name:
+        name, version = name.split('@v', 1)
+    if version is None:
+        version = os.getenv(f'ANALYZER_PROMPT_VERSION_{name.upper()}')
+    if version is None:
+        versions = [v for n, v in TEMPLATES if n == name]
+        if not versions:
+            raise KeyError(f"Unknown prompt template: {name}")
+        version = max(versions)
+    try:
+        return TEMPLATES[(name, int(version))]
+    except KeyError:
+        raise KeyError(f"Unknown prompt template: {name}@v{version}") from None
+
+
+SYSTEM_PROMPT = "You are an expert AI-generated text analyzer."
+
+# Version 1 prompts are kept verbatim so earlier cached verdicts stay addressable. The text sits in
+# the middle of them, which leaves the format section out of any provider prefix cache hit
+register(PromptTemplate('analyze', 1, SYSTEM_PROMPT, """Analyze provided text for AI generation indicators. You are an expert AI-generated text analyzer. And you are given a text. MUST Provide following information:
+            1. AI Score (0-100)
+            2. Very Clear conclusion
+            3. Specific technical patterns with explanations
+            
+            Text: {text}
+            
+            Format response EXACTLY like:
+            ## AI Score: [score]/100
+            ## Conclusion: [conclusion in Chinese]
+            ## Patterns:
+            - [Pattern Name in Chinese]: [Description in Chinese] (Confidence: High/Medium/Low)
+            - [Pattern Name in Chinese]: [Description in Chinese] (Confidence: High/Medium/Low)
+            ..."""))
+
+register(PromptTemplate('analyze_packed', 1, SYSTEM_PROMPT, """Analyze each of the provided texts separately for AI generation indicators. You are an expert AI-generated text analyzer. And you are given {count} texts, each starting with a line <<<DOC [id]>>> and ending with <<<END [id]>>>. MUST Provide following information for EVERY text:
+            1. AI Score (0-100)
+            2. Very Clear conclusion
+            3. Specific technical patterns with explanations
+            
+            {documents}
+            
+            Format response EXACTLY like, with one section per text in the order given:
+            ### Document: [id]
+            ## AI Score: [score]/100
+            ## Conclusion: [conclusion in Chinese]
+            ## Patterns:
+            - [Pattern Name in Chinese]: [Description in Chinese] (Confidence: High/Medium/Low)
+            - [Pattern Name in Chinese]: [Description in Chinese] (Confidence: High/Medium/Low)
+            ..."""))
+
+# Version 2: every instruction first and the variable input last, so all requests share one cacheable prefix
+register(PromptTemplate('analyze', 2, SYSTEM_PROMPT, """Analyze provided text for AI generation indicators. The text is given at the end, after "Text:". MUST Provide following information:
+1. AI Score (0-100)
+2. Very Clear conclusion
+3. Specific technical patterns with explanations
+
+Format response EXACTLY like:
+## AI Score: [score]/100
+## Conclusion: [conclusion in Chinese]
+## Patterns:
+- [Pattern Name in Chinese]: [Description in Chinese] (Confidence: High/Medium/Low)
+- [Pattern Name in Chinese]: [Description in Chinese] (Confidence: High/Medium/Low)
+...
+
+Text: {text}"""))
+
+register(PromptTemplate('analyze_packed', 2, SYSTEM_PROMPT, """Analyze each of the provided texts separately for AI generation indicators. The texts are given at the end; each starts with a line <<<DOC [id]>>> and ends with <<<END [id]>>>. MUST Provide following information for EVERY text:
+1. AI Score (0-100)
+2. Very Clear conclusion
+3. Specific technical patterns with explanations
+
+Format response EXACTLY like, with one section per text in the order given:
+### Document: [id]
+## AI Score: [score]/100
+## Conclusion: [conclusion in Chinese]
+## Patterns:
+- [Pattern Name in Chinese]: [Description in Chinese] (Confidence: High/Medium/Low)
+- [Pattern Name in Chinese]: [Description in Chinese] (Confidence: High/Medium/Low)
+...
+
+Texts ({count}):
+{documents}"""))
@@ -0,0 +1,130 @@
+import asyncio
+import contextvars
+import threading
+from instrumentation import telemetry
+
+
+class RequestPacker:
+    """Gathers concurrent short documents into packed multi-document completion requests
+
+    A pack is sent once one more document would overrun the prompt token budget, the output token
+    cap or the latency target, or when its oldest document has waited max_wait seconds. Latency is
+    predicted from the decode rate and output tokens per document observed on earlier packs.
+    Documents are only packed with others submitted under the same group key (the caller's model,
+    temperature, prompts and backends), since the whole pack goes out as one request.
+    """
+
+    def __init__(self, max_documents=16, max_document_tokens=600, max_prompt_tokens=8000, max_output_tokens=8192,
+                 latency_target=60.0, max_wait=0.05, seconds_per_output_token=0.02, output_margin=1.5, smoothing=0.2):
+        self.max_documents = max_documents
+        # Longer documents gain little from sharing the fixed prompt and go out on their own
+        self.max_document_tokens = max_document_tokens
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_output_tokens = max_output_tokens
+        self.latency_target = latency_target
+        self.max_wait = max_wait
+        # Headroom over the observed average so a wordier reply does not truncate the last documents
+        self.output_margin = output_margin
+        self.smoothing = smoothing
+        # Starting guesses (about 50 tokens/s); replaced by moving averages once packs complete
+        self.seconds_per_output_token = seconds_per_output_token
+        self.output_tokens_per_document = None
+        # group key -> {'items', 'prompt_tokens', 'output_tokens', 'flush_handle'}
+        self._groups = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self.packs = 0
+        self.packed_documents = 0
+        self.fallbacks = 0
+        self.documents = telemetry.counter('analyzer_packed_documents_total', 'Documents sent in packed requests by how their verdict was obtained', ('result',))
+        self.pack_sizes = telemetry.histogram('analyzer_pack_size', 'Documents per packed request', buckets=(1, 2, 4, 8, 12, 16, 24, 32))
+
+    def accepts(self, prompt_tokens):
+        return self.max_documents > 1 and prompt_tokens <= self.max_document_tokens
+
+    def _output_allowance(self, output_tokens):
+        # Worst-case budget until replies have been measured, then the observed average with headroom
+        if self.output_tokens_per_document is None:
+            return output_tokens
+        return min(output_tokens, int(self.output_tokens_per_document * self.output_margin) + 1)
+
+    def _fits(self, pending, prompt_tokens, output_tokens):
+        count = len(pending['items']) + 1
+        output_total = pending['output_tokens'] + output_tokens
+        return (count <= self.max_documents
+                and pending['prompt_tokens'] + prompt_tokens <= self.max_prompt_tokens
+                and output_total <= self.max_output_tokens
+                and output_total / self.output_margin * self.seconds_per_output_token <= self.latency_target)
+
+    async def submit(self, text, prompt_tokens, output_tokens, send, group=None):
+        """Queue one document and wait for its (analysis, pack size); send(items) runs the packed call
+
+        Only documents submitted with an equal group key share a pack.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        allowance = self._output_allowance(output_tokens)
+        pending = self._groups.get(group)
+        if pending is not None and not self._fits(pending, prompt_tokens, allowance):
+            self._flush(group, send)
+            pending = None
+        if pending is None:
+            pending = self._groups[group] = {'items': [], 'prompt_tokens': 0, 'output_tokens': 0, 'flush_handle': None}
+        pending['items'].append({'text': text, 'output_tokens': output_tokens, 'future': future})
+        pending['prompt_tokens'] += prompt_tokens
+        pending['output_tokens'] += allowance
+        if len(pending['items']) >= self.max_documents:
+            self._flush(group, send)
+        elif pending['flush_handle'] is None:
+            pending['flush_handle'] = loop.call_later(self.max_wait, self._flush, group, send)
+        return await future
+
+    def _flush(self, group, send):
+        pending = self._groups.pop(group, None)
+        if pending is None:
+            return
+        if pending['flush_handle'] is not None:
+            pending['flush_handle'].cancel()
+        max_tokens = min(self.max_output_tokens, pending['output_tokens'])
+        # Callers that gave up while waiting are dropped before the pack is built
+        items = [item for item in pending['items'] if not item['future'].done()]
+        if not items:
+            return
+        # A fresh context, so the pack is timed as its own request rather than inside whichever caller flushed it
+        task = asyncio.get_running_loop().create_task(send(items, max_tokens), context=contextvars.Context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def observe(self, documents, completion_tokens, seconds, fallbacks):
+        """Fold a finished pack into the decode-rate and reply-length averages"""
+        self.pack_sizes.observe(documents)
+        self.documents.inc(documents - fallbacks, result='parsed')
+        if fallbacks:
+            self.documents.inc(fallbacks, result='fallback')
+        with self._lock:
+            self.packs += 1
+            self.packed_documents += documents
+            self.fallbacks += fallbacks
+            if completion_tokens <= 0:
+                return
+            # Time to first token is folded in, which errs towards smaller packs
+            rate = seconds / completion_tokens
+            per_document = completion_tokens / documents
+            alpha = self.smoothing
+            self.seconds_per_output_token += alpha * (rate - self.seconds_per_output_token)
+            if self.output_tokens_per_document is None:
+                self.output_tokens_per_document = per_document
+            else:
+                self.output_tokens_per_document += alpha * (per_document - self.output_tokens_per_document)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'packs': self.packs,
+                'packed_documents': self.packed_documents,
+                'mean_pack_size': self.packed_documents / self.packs if self.packs else None,
+                'fallbacks': self.fallbacks,
+                'fallback_rate': self.fallbacks / self.packed_documents if self.packed_documents else 0.0,
+                'output_tokens_per_document': self.output_tokens_per_document,
+                'output_tokens_per_second': 1 / self.seconds_per_output_token if self.seconds_per_output_token else None
+            }
@@ -0,0 +1,76 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from text_chunker import split_paragraphs
+from verdict_cache import normalize_text
+from instrumentation import telemetry
+
+
+def content_hash(text):
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()[:24]
+
+
+def paragraph_hashes(text):
+    return [content_hash(paragraph) for paragraph in split_paragraphs(text)]
+
+
+def paragraph_changes(previous, current):
+    """Counts of paragraphs added, edited and removed going from previous to current, by a paragraph-level diff"""
+    changes = {'added': 0, 'edited': 0, 'removed': 0}
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, previous, current, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            continue
+        # A replaced run pairs old and new paragraphs as edits; any surplus on either side was added or removed
+        edited = min(i2 - i1, j2 - j1) if tag == 'replace' else 0
+        changes['edited'] += edited
+        changes['added'] += j2 - j1 - edited
+        changes['removed'] += i2 - i1 - edited
+    return changes
+
+
+class RevisionStore:
+    """Last analyzed revision of each document (session or document ID) with its per-section verdicts
+
+    Held in memory and bounded by least-recently-used eviction; sections that are no longer current are
+    dropped when the next revision is stored, so an editing session does not grow without limit.
+    """
+
+    def __init__(self, max_documents=1000):
+        self.max_documents = max_documents
+        self._revisions = OrderedDict()
+        self._lock = threading.Lock()
+        self.sections_reused = 0
+        self.sections_analyzed = 0
+        self.sections = telemetry.counter('analyzer_revision_sections_total', 'Sections of resubmitted documents by whether their verdict was reused', ('result',))
+
+    def get(self, document_id):
+        with self._lock:
+            revision = self._revisions.get(document_id)
+            if revision is not None:
+                self._revisions.move_to_end(document_id)
+            return revision
+
+    def put(self, document_id, revision):
+        with self._lock:
+            self._revisions[document_id] = revision
+            self._revisions.move_to_end(document_id)
+            while len(self._revisions) > self.max_documents:
+                self._revisions.popitem(last=False)
+
+    def record(self, reused, analyzed):
+        self.sections.inc(reused, result='reused')
+        self.sections.inc(analyzed, result='analyzed')
+        with self._lock:
+            self.sections_reused += reused
+            self.sections_analyzed += analyzed
+
+    def stats(self):
+        with self._lock:
+            total = self.sections_reused + self.sections_analyzed
+            return {
+                'documents': len(self._revisions),
+                'sections_reused': self.sections_reused,
+                'sections_analyzed': self.sections_analyzed,
+                'reuse_rate': self.sections_reused / total if total else 0.0
+            }
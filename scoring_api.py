@@ -0,0 +1,326 @@
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from openai import APIConnectionError, APIStatusError
+from ai_generated_analyzer import AIGeneratedAnalyzer
+from backend_pool import BackendPool
+from extraction_cache import ExtractionCache
+from request_packer import RequestPacker
+from revision_store import RevisionStore
+from instrumentation import telemetry
+from text_extraction import MIME_TYPES, extract_text, mime_type_for_path
+from verdict_cache import normalize_text
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution whose result every caller shares"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Return (result, coalesced); only the first caller for an in-flight key runs fn"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            # Completed keys are dropped at once; later identical requests are served by the verdict cache
+            with self._lock:
+                del self._calls[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class ScoringServer(ThreadingHTTPServer):
+    """JSON scoring API over AIGeneratedAnalyzer with request coalescing and 429 admission control"""
+
+    daemon_threads = True
+    # socketserver's default backlog of 5 would leave a connection burst waiting on SYN retransmits instead of
+    # getting a prompt 429
+    request_queue_size = 128
+
+    def __init__(self, analyzer, host='127.0.0.1', port=8080, max_in_flight=64, max_body_bytes=50 * 1024 * 1024,
+                 max_chars=500000, chunked=True, max_chunk_tokens=1500, extraction_cache=None):
+        super().__init__((host, port), _Handler)
+        self.analyzer = analyzer
+        # extraction_cache=None uses the default on-disk extraction cache, extraction_cache=False disables it
+        self.extraction_cache = ExtractionCache() if extraction_cache is None else (extraction_cache or None)
+        self.max_in_flight = max_in_flight
+        self.max_body_bytes = max_body_bytes
+        self.max_chars = max_chars
+        self.chunked = chunked
+        self.max_chunk_tokens = max_chunk_tokens
+        self.singleflight = SingleFlight()
+        # Non-blocking admission: past max_in_flight, callers get 429 instead of an unbounded queue
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self.http_requests = telemetry.counter('analyzer_http_requests_total', 'Scoring API requests by endpoint and status', ('endpoint', 'status'))
+        self.coalesced = telemetry.counter('analyzer_http_coalesced_total', 'Scoring API requests served by another in-flight identical request')
+        telemetry.gauge('analyzer_http_in_flight', 'Scoring API requests currently admitted', lambda: self.in_flight)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='scoring-api', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def admit(self):
+        if not self._slots.acquire(blocking=False):
+            return False
+        with self._lock:
+            self.in_flight += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def options(self, params):
+        chunked = params.get('chunked', self.chunked)
+        max_chunk_tokens = params.get('max_chunk_tokens', self.max_chunk_tokens)
+        bypass_cache = params.get('bypass_cache', False)
+        if not isinstance(chunked, bool) or not isinstance(bypass_cache, bool):
+            raise BadRequest("'chunked' and 'bypass_cache' must be booleans")
+        if not isinstance(max_chunk_tokens, int) or isinstance(max_chunk_tokens, bool) or not 100 <= max_chunk_tokens <= 32000:
+            raise BadRequest("'max_chunk_tokens' must be an integer between 100 and 32000")
+        document_id = params.get('document_id')
+        if document_id is not None and (not isinstance(document_id, str) or not 0 < len(document_id) <= 200):
+            raise BadRequest("'document_id' must be a string of 1 to 200 characters")
+        return {'chunked': chunked, 'max_chunk_tokens': max_chunk_tokens, 'bypass_cache': bypass_cache, 'document_id': document_id}
+
+    def score_text(self, text, options):
+        # With a document_id, a resubmitted edit only re-scores the sections that changed since the last one
+        if options['chunked'] and options['document_id'] is not None and self.analyzer.revision_stats() is not None:
+            return self.analyzer.analyze_revision(text, options['document_id'], max_chunk_tokens=options['max_chunk_tokens'],
+                                                  bypass_cache=options['bypass_cache'])
+        if options['chunked']:
+            return self.analyzer.analyze_chunked(text, max_chunk_tokens=options['max_chunk_tokens'], bypass_cache=options['bypass_cache'])
+        return self.analyzer.analyze_text(text, bypass_cache=options['bypass_cache'])
+
+    def score_file(self, data, file_type, options):
+        with telemetry.span('extract', file_type=file_type, bytes=len(data)):
+            try:
+                if self.extraction_cache is not None:
+                    text = self.extraction_cache.extract(data, file_type, max_chars=self.max_chars)['text']
+                else:
+                    text = extract_text(data, file_type, max_chars=self.max_chars)
+            except sqlite3.Error:
+                raise
+            except Exception as e:
+                # Corrupt, truncated or mislabelled uploads (PdfReadError, BadZipFile, UnicodeDecodeError, ...) are the client's
+                raise BadRequest(f"Could not extract text from the file: {type(e).__name__}: {e}") from e
+        telemetry.extracted_bytes.inc(len(data), file_type=file_type)
+        telemetry.extracted_chars.inc(len(text or ''), file_type=file_type)
+        if not text or not text.strip():
+            raise BadRequest("No text could be extracted from the file")
+        return self.score_text(text, options)
+
+
+def _flight_key(kind, content, options):
+    h = hashlib.sha256(kind.encode('utf-8'))
+    h.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+    h.update(content)
+    return h.hexdigest()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=()):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message, kind, headers=()):
+        self._send_json(status, {'error': {'message': message, 'type': kind}}, headers)
+
+    def _refuse(self, status, message, kind, headers=()):
+        # For replies sent without reading the body: the unread bytes would be parsed as the next request, so the
+        # connection is closed, and the client is told so it does not reuse a socket this end has dropped
+        self.close_connection = True
+        self._error(status, message, kind, [*headers, ('Connection', 'close')])
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/healthz':
+            self._send_json(200, {'status': 'ok', 'in_flight': self.server.in_flight, 'max_in_flight': self.server.max_in_flight})
+        elif path == '/metrics':
+            body = telemetry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._error(404, f"Unknown path {path}", 'not_found')
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        endpoint = {'/v1/analyze': 'text', '/v1/analyze/file': 'file'}.get(url.path.rstrip('/'))
+        status = self._post(url, endpoint)
+        self.server.http_requests.inc(endpoint=endpoint or 'unknown', status=status)
+
+    def _post(self, url, endpoint):
+        server = self.server
+        if endpoint is None:
+            self._refuse(404, f"Unknown path {url.path}", 'not_found')
+            return 404
+        # Admit before reading: an overloaded server should not buffer bodies it is about to turn away
+        if not server.admit():
+            self._refuse(429, "Scoring service is at capacity, retry shortly", 'overloaded', headers=[('Retry-After', '1')])
+            return 429
+        try:
+            length = self.headers.get('Content-Length')
+            if length is None:
+                self._refuse(411, "Content-Length is required", 'length_required')
+                return 411
+            try:
+                length = int(length)
+            except ValueError:
+                length = -1
+            if length < 0:
+                self._refuse(400, "Content-Length must be a non-negative integer", 'invalid_request')
+                return 400
+            if length > server.max_body_bytes:
+                self._refuse(413, f"Request body exceeds {server.max_body_bytes} bytes", 'payload_too_large')
+                return 413
+            body = self.rfile.read(length)
+
+            with telemetry.request(source='http', endpoint=endpoint, bytes=length):
+                if endpoint == 'text':
+                    try:
+                        params = json.loads(body or b'{}')
+                    except ValueError:
+                        raise BadRequest("Body must be JSON like {\"text\": \"...\"}")
+                    text = params.get('text') if isinstance(params, dict) else None
+                    if not isinstance(text, str) or not text.strip():
+                        raise BadRequest("'text' must be a non-empty string")
+                    options = server.options(params)
+                    key = _flight_key('text', normalize_text(text).encode('utf-8'), options)
+                    result, coalesced = server.singleflight.do(key, lambda: server.score_text(text, options))
+                else:
+                    query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+                    # The file type comes from a known MIME Content-Type or from ?filename=
+                    file_type = self.headers.get('Content-Type', '').split(';')[0].strip()
+                    if file_type not in MIME_TYPES.values():
+                        file_type = mime_type_for_path(query.get('filename', ''))
+                    if file_type is None:
+                        raise BadRequest(f"Unsupported file type; send one of {', '.join(sorted(MIME_TYPES))} "
+                                         "with its MIME Content-Type or ?filename=")
+                    if not body:
+                        raise BadRequest("Empty file")
+                    params = {name: json.loads(value) for name, value in query.items()
+                              if name in ('chunked', 'max_chunk_tokens', 'bypass_cache')}
+                    if 'document_id' in query:
+                        params['document_id'] = query['document_id']
+                    options = server.options(params)
+                    key = _flight_key('file:' + file_type, body, options)
+                    result, coalesced = server.singleflight.do(key, lambda: server.score_file(body, file_type, options))
+                telemetry.annotate(coalesced=coalesced)
+        except (BadRequest, json.JSONDecodeError) as e:
+            self._error(400, str(e), 'invalid_request')
+            return 400
+        except (APIStatusError, APIConnectionError) as e:
+            self._error(502, f"Model backend error: {e}", 'upstream_error')
+            return 502
+        except Exception as e:
+            self._error(500, f"{type(e).__name__}: {e}", 'internal_error')
+            return 500
+        finally:
+            server.release()
+
+        if coalesced:
+            server.coalesced.inc()
+        self._send_json(200, result, headers=[('X-Coalesced', '1' if coalesced else '0')])
+        return 200
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP scoring API for AI-generated content detection")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--model', default='deepseek-chat')
+    parser.add_argument('--base-url', default='https://api.deepseek.com')
+    parser.add_argument('--backends', default=None, help="JSON file listing endpoints to route and hedge between (overrides --model/--base-url)")
+    parser.add_argument('--max-in-flight', type=int, default=64, help="Requests admitted at once; further requests get 429")
+    parser.add_argument('--max-concurrency', type=int, default=16, help="Concurrent upstream model calls")
+    parser.add_argument('--rpm', type=int, default=None, help="Requests-per-minute limit")
+    parser.add_argument('--tpm', type=int, default=None, help="Tokens-per-minute limit")
+    parser.add_argument('--max-body-mb', type=float, default=50)
+    parser.add_argument('--max-chars', type=int, default=500000, help="Stop extracting a file after this many characters")
+    parser.add_argument('--max-chunk-tokens', type=int, default=1500)
+    parser.add_argument('--no-chunking', action='store_true', help="Default to sending each document as a single request")
+    parser.add_argument('--pack', action='store_true', help="Pack concurrent short texts into shared model requests")
+    parser.add_argument('--pack-max-wait', type=float, default=0.05, help="Seconds a short text may wait for others to pack with")
+    parser.add_argument('--no-cache', action='store_true', help="Do not read or write the verdict cache")
+    parser.add_argument('--no-extraction-cache', action='store_true', help="Re-extract every uploaded file instead of reusing earlier extractions")
+    args = parser.parse_args(argv)
+
+    if args.backends:
+        with open(args.backends, encoding='utf-8') as f:
+            backends = BackendPool.from_config(json.load(f))
+    else:
+        backends = BackendPool.from_env()
+    analyzer = AIGeneratedAnalyzer(model=args.model, base_url=args.base_url, backends=backends, cache=False if args.no_cache else None,
+                                   max_concurrency=args.max_concurrency, requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                                   packer=RequestPacker(max_wait=args.pack_max_wait) if args.pack else None, revisions=RevisionStore())
+    server = ScoringServer(analyzer, args.host, args.port, max_in_flight=args.max_in_flight,
+                           max_body_bytes=int(args.max_body_mb * 1024 * 1024), max_chars=args.max_chars,
+                           chunked=not args.no_chunking, max_chunk_tokens=args.max_chunk_tokens,
+                           extraction_cache=False if args.no_extraction_cache else None)
+    print(f"Scoring API listening on {server.url} (POST /v1/analyze, POST /v1/analyze/file, GET /metrics)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        analyzer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import re
+from itertools import chain, islice
+
+
+# Rows inspected per sheet before deciding which columns carry prose
+SAMPLE_ROWS = 200
+# A column is kept when most of its values are strings averaging at least this many characters
+MIN_AVG_CHARS = 6
+MIN_TEXT_SHARE = 0.5
+DELIMITER = '\t'
+
+_NUMERIC_RE = re.compile(r'^[\s$€£¥%+\-.,:/()0-9]*$')
+_CODE_RE = re.compile(r'^[A-Z0-9][A-Z0-9_\-./#]*$')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _clean(value):
+    if value is None:
+        return ''
+    return _WHITESPACE_RE.sub(' ', str(value)).strip()
+
+
+def _is_prose(value):
+    # Strings that are really numbers, amounts, dates or reference codes are not text to analyze
+    return isinstance(value, str) and not _NUMERIC_RE.match(value) and not _CODE_RE.match(value.strip())
+
+
+def select_text_columns(rows):
+    """Indexes of columns whose sampled values look like natural-language text"""
+    width = max((len(row) for row in rows), default=0)
+    selected = []
+    for col in range(width):
+        values = [row[col] for row in rows if col < len(row) and _clean(row[col])]
+        if not values:
+            continue
+        prose = [_clean(v) for v in values if _is_prose(v)]
+        if len(prose) / len(values) < MIN_TEXT_SHARE:
+            continue
+        if sum(len(v) for v in prose) / len(prose) >= MIN_AVG_CHARS:
+            selected.append(col)
+    return selected
+
+
+def _has_header(rows):
+    # A first row made only of short strings over data rows is treated as a header
+    return len(rows) > 1 and all(v is None or (isinstance(v, str) and len(v) < 64) for v in rows[0])
+
+
+def iter_sheet_text(name, rows):
+    """Yield a compact delimiter-separated rendering of the text-bearing columns of one sheet"""
+    rows = iter(rows)
+    sample = list(islice(rows, SAMPLE_ROWS))
+    header = sample[0] if _has_header(sample) else None
+    body = sample[1:] if header is not None else sample
+    columns = select_text_columns(body)
+    if not columns:
+        return
+
+    yield f"## Sheet: {name}\n"
+    if header is not None:
+        yield DELIMITER.join(_clean(header[c]) if c < len(header) else '' for c in columns) + '\n'
+    for row in chain(body, rows):
+        cells = [_clean(row[c]) if c < len(row) else '' for c in columns]
+        if any(cells):
+            yield DELIMITER.join(cells) + '\n'
+    yield '\n'
+
+
+def iter_xlsx_text(f):
+    import openpyxl
+    # read_only streams rows from the sheet XML instead of loading the workbook
+    workbook = openpyxl.load_workbook(f, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            yield from iter_sheet_text(sheet.title, sheet.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def iter_xls_text(f):
+    # Legacy .xls is not supported by openpyxl; read it through pandas and reuse the same column filter
+    import pandas as pd
+    sheets = pd.read_excel(f, sheet_name=None, header=None, dtype=object)
+    for name, df in sheets.items():
+        df = df.astype(object).where(df.notna(), None)
+        yield from iter_sheet_text(name, df.itertuples(index=False, name=None))
@@ -0,0 +1,17 @@
+import os
+import sqlite3
+
+
+def open_database(path):
+    """SQLite connection with the settings every on-disk store here shares
+
+    One connection per store, used from many threads behind the store's own lock. WAL lets
+    readers in other processes proceed during a write, and synchronous=NORMAL is durable
+    enough for caches and a job queue that can re-run work.
+    """
+    if path != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    return db
@@ -0,0 +1,210 @@
+import json
+import re
+import threading
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+_TOKEN_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]|[^\W\d_]+')
+_SENTENCE_RE = re.compile(r'[.!?。！？]+')
+_PUNCT_RE = re.compile(r'[^\w\s]')
+
+FUNCTION_WORDS = [
+    'the', 'a', 'an', 'of', 'and', 'to', 'in', 'is', 'that', 'it', 'for', 'as', 'with', 'was', 'on',
+    'be', 'by', 'this', 'but', 'not', 'or', 'which', 'are', 'at', 'from', 'have', 'has', 'i', 'we', 'you',
+    '的', '了', '是', '在', '和', '也', '就', '都', '而', '及', '与', '着', '或', '我', '你', '这', '那'
+]
+_FUNCTION_INDEX = {w: i for i, w in enumerate(FUNCTION_WORDS)}
+
+FEATURES = [
+    'sentence_length_cv',
+    'burstiness',
+    'type_token_ratio',
+    'ngram_repetition',
+    'punctuation_entropy',
+    'function_word_rate',
+    'function_word_entropy'
+]
+
+# Descriptions used when a feature is reported as a pattern (conclusions are in Chinese, like the model's)
+FEATURE_LABELS = {
+    'sentence_length_cv': ('句长变化', '句子长度的离散程度'),
+    'burstiness': ('突发性', '句长分布的突发性（长短句交替程度）'),
+    'type_token_ratio': ('词汇多样性', '滑动窗口类符/形符比'),
+    'ngram_repetition': ('N元语法重复', '三元词组的重复率'),
+    'punctuation_entropy': ('标点熵', '标点符号使用分布的信息熵'),
+    'function_word_rate': ('功能词比例', '功能词在全部词语中的占比'),
+    'function_word_entropy': ('功能词分布', '功能词使用分布的信息熵')
+}
+
+# Uncalibrated and English-centric: uniform sentence lengths, repeated phrasing and flat punctuation lean AI.
+# Good enough to collect a pre-score histogram, not to decide anything; local verdicts need fitted weights
+# from StylometricPrescreen.fit() (or a file written by save()).
+DEFAULT_PARAMS = {
+    'mean': [0.55, -0.30, 0.72, 0.02, 1.60, 0.38, 3.40],
+    'scale': [0.20, 0.12, 0.08, 0.03, 0.45, 0.08, 0.45],
+    'weights': [-1.1, -0.9, -0.3, 0.9, -0.6, 0.2, -0.4],
+    'bias': 0.0
+}
+
+MATTR_WINDOW = 100
+MAX_WINDOWS = 2000
+
+
+def _entropy(counts):
+    counts = counts[counts > 0].astype(float)
+    if counts.size == 0:
+        return 0.0
+    p = counts / counts.sum()
+    return float(-(p * np.log2(p)).sum())
+
+
+def extract_features(text):
+    """Vectorized stylometric features; returns (feature vector, word count)"""
+    tokens = _TOKEN_RE.findall(text.lower())
+    n = len(tokens)
+    features = np.zeros(len(FEATURES))
+    if n < 3:
+        return features, n
+    _, ids = np.unique(np.array(tokens), return_inverse=True)
+    ids = ids.astype(np.int64)
+    vocab = int(ids.max()) + 1
+
+    sentence_lengths = np.array([len(_TOKEN_RE.findall(s)) for s in _SENTENCE_RE.split(text)], dtype=float)
+    sentence_lengths = sentence_lengths[sentence_lengths > 0]
+    if sentence_lengths.size > 1:
+        mu, sigma = sentence_lengths.mean(), sentence_lengths.std()
+        features[0] = sigma / mu
+        features[1] = (sigma - mu) / (sigma + mu)
+
+    # Moving-average TTR is stable across document lengths, unlike raw TTR
+    if n > MATTR_WINDOW:
+        windows = sliding_window_view(ids, MATTR_WINDOW)
+        windows = windows[::max(1, len(windows) // MAX_WINDOWS)]
+        ordered = np.sort(windows, axis=1)
+        features[2] = ((np.diff(ordered, axis=1) != 0).sum(axis=1) + 1).mean() / MATTR_WINDOW
+    else:
+        features[2] = vocab / n
+
+    trigrams = (ids[:-2] * vocab + ids[1:-1]) * vocab + ids[2:]
+    features[3] = 1.0 - np.unique(trigrams).size / trigrams.size
+
+    punctuation = _PUNCT_RE.findall(text)
+    if punctuation:
+        _, counts = np.unique(np.array(punctuation), return_counts=True)
+        features[4] = _entropy(counts)
+
+    function_counts = np.bincount(
+        [_FUNCTION_INDEX[t] for t in tokens if t in _FUNCTION_INDEX], minlength=len(FUNCTION_WORDS)
+    )
+    features[5] = function_counts.sum() / n
+    features[6] = _entropy(function_counts)
+    return features, n
+
+
+class StylometricPrescreen:
+    """Local pre-score with confidence bands; only inputs between the bands go to the model"""
+
+    def __init__(self, human_below=10, ai_above=90, min_words=150, params=None):
+        self.human_below = human_below
+        self.ai_above = ai_above
+        self.min_words = min_words
+        self.set_params(params or DEFAULT_PARAMS)
+        self.calibrated = params is not None
+        self._lock = threading.Lock()
+        self.local_human = 0
+        self.local_ai = 0
+        self.escalated = 0
+        self.histogram = np.zeros(10, dtype=np.int64)
+
+    def set_params(self, params):
+        self.mean = np.asarray(params['mean'], dtype=float)
+        self.scale = np.asarray(params['scale'], dtype=float)
+        self.weights = np.asarray(params['weights'], dtype=float)
+        self.bias = float(params['bias'])
+
+    def params(self):
+        return {'mean': self.mean.tolist(), 'scale': self.scale.tolist(), 'weights': self.weights.tolist(), 'bias': self.bias}
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with open(path, encoding='utf-8') as f:
+            return cls(params=json.load(f), **kwargs)
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.params(), f, indent=2)
+
+    def prescore(self, text):
+        """0-100 pre-score plus the per-feature contributions behind it"""
+        features, words = extract_features(text)
+        contributions = self.weights * (features - self.mean) / self.scale
+        logit = contributions.sum() + self.bias
+        return 100.0 / (1.0 + np.exp(-logit)), features, contributions, words
+
+    def fit(self, texts, labels, epochs=500, learning_rate=0.1, l2=0.01):
+        """Calibrate weights by logistic regression on labelled texts (1 = AI-generated)"""
+        X = np.stack([extract_features(t)[0] for t in texts])
+        y = np.asarray(labels, dtype=float)
+        self.mean = X.mean(axis=0)
+        self.scale = X.std(axis=0) + 1e-6
+        Z = (X - self.mean) / self.scale
+        w = np.zeros(Z.shape[1])
+        b = 0.0
+        for _ in range(epochs):
+            p = 1.0 / (1.0 + np.exp(-(Z @ w + b)))
+            w -= learning_rate * (Z.T @ (p - y) / len(y) + l2 * w)
+            b -= learning_rate * (p - y).mean()
+        self.weights, self.bias = w, float(b)
+        self.calibrated = True
+        return self
+
+    def screen(self, text, human_below=None, ai_above=None):
+        """Local verdict shaped like AIGeneratedAnalyzer._parse_response, or None to escalate
+
+        human_below/ai_above override the instance bands for this call, so one shared pre-screen can serve
+        callers with different bands. Without calibrated weights every input is escalated.
+        """
+        human_below = self.human_below if human_below is None else human_below
+        ai_above = self.ai_above if ai_above is None else ai_above
+        score, features, contributions, words = self.prescore(text)
+        with self._lock:
+            self.histogram[min(9, int(score // 10))] += 1
+            if not self.calibrated or words < self.min_words or human_below < score < ai_above:
+                self.escalated += 1
+                return None
+            if score <= human_below:
+                self.local_human += 1
+            else:
+                self.local_ai += 1
+
+        is_ai = score >= ai_above
+        # Report the features that pushed the score furthest in the winning direction
+        order = np.argsort(-contributions if is_ai else contributions)[:3]
+        patterns = []
+        for i in order:
+            name, description = FEATURE_LABELS[FEATURES[i]]
+            strength = abs(contributions[i])
+            patterns.append({
+                'pattern': name,
+                'description': f"{description}为 {features[i]:.3f}",
+                'confidence': 'High' if strength > 2 else 'Medium' if strength > 1 else 'Low'
+            })
+        return {
+            'score': int(round(score)),
+            'conclusion': "本地文体预筛：文本统计特征明显符合AI生成文本" if is_ai else "本地文体预筛：文本统计特征明显符合人工写作",
+            'patterns': patterns,
+            'source': 'prescreen'
+        }
+
+    def stats(self):
+        with self._lock:
+            total = self.local_human + self.local_ai + self.escalated
+            return {
+                'screened': total,
+                'local_human': self.local_human,
+                'local_ai': self.local_ai,
+                'escalated': self.escalated,
+                'escalation_rate': self.escalated / total if total else 0.0,
+                'prescore_histogram': self.histogram.tolist()
+            }
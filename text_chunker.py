@@ -0,0 +1,99 @@
+import re
+import zlib
+
+
+_CJK_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+_PARAGRAPH_RE = re.compile(r'\n\s*\n|\r\n\s*\r\n')
+_SENTENCE_RE = re.compile(r'(?<=[.!?;])\s+|(?<=[。！？；])')
+
+
+def estimate_tokens(text):
+    # Rough local estimate: CJK characters are ~1 token each, other text ~4 characters per token
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def split_paragraphs(text):
+    return [paragraph.strip() for paragraph in _PARAGRAPH_RE.split(text) if paragraph.strip()]
+
+
+def _split_oversized(piece, max_tokens):
+    # Last resort for a single sentence longer than the window: cut on character count
+    step = max(1, len(piece) * max_tokens // max(1, estimate_tokens(piece)))
+    return [piece[i:i + step] for i in range(0, len(piece), step)]
+
+
+def _segments(text, max_tokens):
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            yield paragraph
+            continue
+        for sentence in _SENTENCE_RE.split(paragraph):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if estimate_tokens(sentence) <= max_tokens:
+                yield sentence
+            else:
+                yield from _split_oversized(sentence, max_tokens)
+
+
+def split_into_chunks(text, max_tokens=1500, min_chars=200):
+    """Split text on paragraph/sentence boundaries into windows of at most max_tokens"""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for segment in _segments(text, max_tokens):
+        tokens = estimate_tokens(segment)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append('\n\n'.join(current))
+            current, current_tokens = [], 0
+        current.append(segment)
+        current_tokens += tokens
+    if current:
+        chunks.append('\n\n'.join(current))
+
+    # A short trailing chunk is too small to score on its own, fold it into the previous one
+    if len(chunks) > 1 and len(chunks[-1]) < min_chars:
+        tail = chunks.pop()
+        chunks[-1] = chunks[-1] + '\n\n' + tail
+    return chunks
+
+
+def split_into_stable_chunks(text, max_tokens=1500, min_fill=0.7, min_chars=200):
+    """Split like split_into_chunks, but let paragraph content pick section ends so an edit only moves nearby boundaries"""
+    chunks = []
+    current = []
+    current_tokens = 0
+    # (hash, segment count) of the lowest-hashed segment that could end the current section
+    cut = None
+    for segment in _segments(text, max_tokens):
+        tokens = estimate_tokens(segment)
+        if current and current_tokens + tokens > max_tokens:
+            # End the section after its lowest-hashed segment past min_fill. That choice depends on content rather
+            # than position, so after an edit the following sections soon line up with the previous revision again
+            end = cut[1] if cut is not None else len(current)
+            chunks.append('\n\n'.join(current[:end]))
+            current = current[end:]
+            current_tokens = sum(estimate_tokens(piece) for piece in current)
+            cut = None
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append('\n\n'.join(current))
+                current, current_tokens = [], 0
+        current.append(segment)
+        current_tokens += tokens
+        # Only cuts that leave the section min_fill full are considered, so it costs about as many requests as split_into_chunks
+        if current_tokens >= min_fill * max_tokens:
+            digest = zlib.crc32(segment.encode('utf-8'))
+            if cut is None or digest < cut[0]:
+                cut = (digest, len(current))
+    if current:
+        chunks.append('\n\n'.join(current))
+
+    if len(chunks) > 1 and len(chunks[-1]) < min_chars:
+        tail = chunks.pop()
+        chunks[-1] = chunks[-1] + '\n\n' + tail
+    return chunks
@@ -0,0 +1,264 @@
+import io
+import os
+import time
+import shutil
+import tempfile
+import zipfile
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from xml.etree.ElementTree import iterparse
+# Format-specific parsers (PyPDF2, openpyxl, pandas) are imported on first use of that format
+
+
+# Extension -> MIME type as reported by Streamlit's uploader, so headless callers share the same branches
+MIME_TYPES = {
+    'txt': 'text/plain',
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'xls': 'application/vnd.ms-excel'
+}
+
+# Bump whenever a change here alters extracted text, so cached extractions from older code are not reused
+EXTRACTOR_VERSION = '1'
+
+# PDFs with fewer pages than this are parsed in-process; pool start-up would cost more than it saves
+PARALLEL_MIN_PAGES = 16
+TEXT_BLOCK_SIZE = 64 * 1024
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+# Callers run this inside threaded servers (Streamlit, the job workers, the scoring API), where forking
+# could copy a lock some other thread holds; workers are started from a clean forkserver process instead
+POOL_CONTEXT = multiprocessing.get_context('forkserver')
+PDF_POOL_WORKERS = int(os.getenv('ANALYZER_EXTRACT_WORKERS') or os.cpu_count() or 1)
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def mime_type_for_path(path):
+    return MIME_TYPES.get(os.path.splitext(path)[1].lstrip('.').lower())
+
+
+def _get_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_POOL_WORKERS, mp_context=POOL_CONTEXT)
+            atexit.register(_pdf_pool.shutdown, wait=False, cancel_futures=True)
+        return _pdf_pool
+
+
+def _discard_pdf_pool(pool):
+    # A pool that lost a worker (e.g. killed for memory on a huge PDF) refuses all further work; drop it so the
+    # next parallel extraction builds a fresh one
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@contextmanager
+def _open_binary(source):
+    # Paths are opened lazily, bytes are wrapped without copying, file objects are used in place
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield f
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(source)
+    else:
+        source.seek(0)
+        yield source
+
+
+@contextmanager
+def _as_path(source):
+    # Worker processes need something they can open themselves: spill in-memory uploads to a temp file
+    if isinstance(source, (str, os.PathLike)):
+        yield os.fspath(source)
+        return
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as spill, _open_binary(source) as f:
+            shutil.copyfileobj(f, spill, TEXT_BLOCK_SIZE)
+        yield path
+    finally:
+        os.unlink(path)
+
+
+def _extract_pdf_pages(path, start, stop):
+    import PyPDF2
+    reader = PyPDF2.PdfReader(path)
+    return [(reader.pages[i].extract_text() or "") + "\n" for i in range(start, stop)]
+
+
+def _iter_pdf(source, workers):
+    import PyPDF2
+    with _open_binary(source) as f:
+        reader = PyPDF2.PdfReader(f)
+        page_count = len(reader.pages)
+        workers = min(workers or PDF_POOL_WORKERS, PDF_POOL_WORKERS)
+        if workers == 1 or page_count < PARALLEL_MIN_PAGES:
+            for page in reader.pages:
+                yield (page.extract_text() or "") + "\n"
+            return
+
+    # Small batches keep every core busy and limit wasted work when the character budget stops us early
+    batch = max(1, min(16, page_count // (workers * 4)))
+    with _as_path(source) as path:
+        pool = _get_pdf_pool()
+        futures = []
+        next_page = 0
+        try:
+            try:
+                for start in range(0, page_count, batch):
+                    futures.append(pool.submit(_extract_pdf_pages, path, start, min(start + batch, page_count)))
+                broken = False
+            except BrokenProcessPool:
+                broken = True
+            for future in futures:
+                if broken:
+                    break
+                try:
+                    pages = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    break
+                for page in pages:
+                    yield page
+                    next_page += 1
+            if broken:
+                # The rest of this file is read here instead of failing it
+                _discard_pdf_pool(pool)
+                reader = PyPDF2.PdfReader(path)
+                for i in range(next_page, page_count):
+                    yield (reader.pages[i].extract_text() or "") + "\n"
+        finally:
+            for future in futures:
+                future.cancel()
+            # The spill file must outlive any batch already running in a worker
+            for future in futures:
+                if not future.cancelled():
+                    future.exception()
+
+
+def _iter_docx(source):
+    # Stream paragraphs straight out of the OOXML parts instead of building the whole document in memory
+    with _open_binary(source) as f, zipfile.ZipFile(f) as docx:
+        names = docx.namelist()
+        parts = sorted(n for n in names if n.startswith('word/header') and n.endswith('.xml'))
+        parts += ['word/document.xml']
+        parts += sorted(n for n in names if n.startswith('word/footer') and n.endswith('.xml'))
+        for part in parts:
+            if part not in names:
+                continue
+            with docx.open(part) as xml:
+                pieces = []
+                for event, elem in iterparse(xml, events=('end',)):
+                    if elem.tag == _W + 't':
+                        pieces.append(elem.text or "")
+                    elif elem.tag == _W + 'tab':
+                        pieces.append('\t')
+                    elif elem.tag in (_W + 'br', _W + 'cr'):
+                        pieces.append('\n')
+                    elif elem.tag == _W + 'p':
+                        # Blank line between paragraphs, as docx2txt did, so chunking still sees paragraph breaks
+                        pieces.append('\n\n')
+                        yield ''.join(pieces)
+                        pieces = []
+                        elem.clear()
+
+
+def _iter_plain_text(source):
+    with _open_binary(source) as f:
+        reader = io.TextIOWrapper(f, encoding='utf-8', newline='')
+        try:
+            while True:
+                block = reader.read(TEXT_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+        finally:
+            # Leave caller-owned file objects open
+            reader.detach()
+
+
+def _iter_spreadsheet(source, legacy):
+    from spreadsheet_extraction import iter_xls_text, iter_xlsx_text
+    with _open_binary(source) as f:
+        yield from (iter_xls_text(f) if legacy else iter_xlsx_text(f))
+
+
+def iter_text(source, file_type, max_chars=None, workers=None):
+    """Lazily yield text from a path, bytes or binary file object, stopping once max_chars is reached
+
+    PDF pages are extracted across a process pool unless workers=1.
+    """
+    if 'text/plain' in file_type:
+        # Text files
+        pieces = _iter_plain_text(source)
+    elif 'application/pdf' in file_type:
+        # PDF files
+        pieces = _iter_pdf(source, workers)
+    elif 'application/vnd.openxmlformats-officedocument.wordprocessingml.document' in file_type:
+        # DOCX files
+        pieces = _iter_docx(source)
+    elif 'application/vnd.ms-excel' in file_type or 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet' in file_type:
+        # Excel files: all sheets, text-bearing columns only
+        pieces = _iter_spreadsheet(source, legacy='application/vnd.ms-excel' in file_type)
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+    remaining = max_chars
+    try:
+        for piece in pieces:
+            if remaining is not None:
+                piece = piece[:remaining]
+                remaining -= len(piece)
+            yield piece
+            if remaining is not None and remaining <= 0:
+                break
+    finally:
+        pieces.close()
+
+
+def extract_text(source, file_type, max_chars=None, workers=None):
+    """Extract text from a path, bytes or binary file object; returns None for unsupported types"""
+    if not any(mime in file_type for mime in MIME_TYPES.values()):
+        return None
+    return ''.join(iter_text(source, file_type, max_chars=max_chars, workers=workers))
+
+
+def extract_document(source, file_type, max_chars=None, workers=None):
+    """Extract text plus PDF page start offsets and whether the whole document was read"""
+    started = time.perf_counter()
+    pieces = []
+    page_offsets = [] if 'application/pdf' in file_type else None
+    chars = 0
+    for piece in iter_text(source, file_type, max_chars=max_chars, workers=workers):
+        if page_offsets is not None:
+            page_offsets.append(chars)
+        pieces.append(piece)
+        chars += len(piece)
+    return {
+        'text': ''.join(pieces),
+        'page_offsets': page_offsets,
+        # Stopping at max_chars leaves a prefix that cannot serve a later request for more text
+        'complete': max_chars is None or chars < max_chars,
+        'file_type': file_type,
+        'extract_seconds': time.perf_counter() - started,
+        'extractor_version': EXTRACTOR_VERSION
+    }
+
+
+def extract_text_from_path(path, max_chars=None, workers=None):
+    file_type = mime_type_for_path(path)
+    if file_type is None:
+        return None
+    return extract_text(path, file_type, max_chars=max_chars, workers=workers)
@@ -0,0 +1,130 @@
+import os
+import threading
+from text_chunker import estimate_tokens, split_into_chunks
+
+try:
+    import tiktoken
+except ImportError:  # optional: the character heuristic is used when tiktoken is not installed
+    tiktoken = None
+
+
+_encoding = None
+SAMPLE_SEPARATOR = "\n\n[...]\n\n"
+
+
+def count_tokens(text):
+    """Local pre-flight token count; exact for OpenAI-style BPE when tiktoken is available"""
+    global _encoding
+    if tiktoken is None:
+        return estimate_tokens(text)
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding('cl100k_base')
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def prompt_cache_tokens(usage):
+    """(hit, miss) prompt tokens served from the provider's prefix cache, or (None, None) if not reported"""
+    # DeepSeek reports prompt_cache_hit_tokens / prompt_cache_miss_tokens, OpenAI prompt_tokens_details.cached_tokens
+    hit = getattr(usage, 'prompt_cache_hit_tokens', None)
+    if hit is not None:
+        return hit, getattr(usage, 'prompt_cache_miss_tokens', None) or 0
+    cached = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', None)
+    if cached is not None:
+        return cached, (getattr(usage, 'prompt_tokens', 0) or 0) - cached
+    return None, None
+
+
+class TokenBudget:
+    """Caps prompt size by representative sampling and sizes max_tokens from the expected pattern count"""
+
+    def __init__(self, max_input_tokens=48000, expected_patterns=8, tokens_per_pattern=100,
+                 base_output_tokens=200, max_output_tokens=2048, sample_tokens=600):
+        self.max_input_tokens = max_input_tokens
+        self.expected_patterns = expected_patterns
+        self.tokens_per_pattern = tokens_per_pattern
+        self.base_output_tokens = base_output_tokens
+        self.max_output_tokens = max_output_tokens
+        self.sample_tokens = sample_tokens
+
+    @classmethod
+    def from_env(cls):
+        """Deployment-wide defaults, overridable with ANALYZER_* environment variables"""
+        defaults = cls()
+        kwargs = {}
+        for name in ('max_input_tokens', 'expected_patterns', 'tokens_per_pattern',
+                     'base_output_tokens', 'max_output_tokens', 'sample_tokens'):
+            value = os.getenv(f'ANALYZER_{name.upper()}')
+            kwargs[name] = int(value) if value else getattr(defaults, name)
+        return cls(**kwargs)
+
+    def output_tokens(self):
+        # Room for the score and conclusion lines plus one line per expected pattern
+        return min(self.max_output_tokens, self.base_output_tokens + self.expected_patterns * self.tokens_per_pattern)
+
+    def fit_text(self, text):
+        """Return text unchanged when within budget, else head, tail and evenly spaced samples"""
+        total_tokens = count_tokens(text) if self.max_input_tokens is not None else 0
+        if self.max_input_tokens is None or total_tokens <= self.max_input_tokens:
+            return text
+
+        windows = split_into_chunks(text, max_tokens=self.sample_tokens, min_chars=0)
+        # Windows usually come in under sample_tokens, so size the slot count from their real average
+        slots = max(2, int(self.max_input_tokens * len(windows) / total_tokens))
+        if len(windows) <= slots:
+            return text[:self._chars_for(text, self.max_input_tokens)]
+
+        # Evenly spaced windows, always including the opening and closing ones
+        picked = sorted({round(i * (len(windows) - 1) / (slots - 1)) for i in range(slots)})
+        sample = SAMPLE_SEPARATOR.join(windows[i] for i in picked)
+        # Separators and window overshoot can push the sample slightly over; trim rather than overspend
+        if count_tokens(sample) > self.max_input_tokens:
+            sample = sample[:self._chars_for(sample, self.max_input_tokens)]
+        return sample
+
+    def _chars_for(self, text, tokens):
+        return max(1, len(text) * tokens // max(1, count_tokens(text)))
+
+
+class TokenUsage:
+    """Running totals of locally estimated vs provider-reported token usage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.estimated_prompt_tokens = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.output_budget_tokens = 0
+        self.prompt_cache_hit_tokens = 0
+        self.prompt_cache_miss_tokens = 0
+
+    def record(self, estimated_prompt_tokens, output_budget, usage):
+        with self._lock:
+            self.requests += 1
+            if usage is not None:
+                # Only paired with a reported count, so the estimate ratio compares like with like
+                self.estimated_prompt_tokens += estimated_prompt_tokens
+                self.output_budget_tokens += output_budget
+                self.prompt_tokens += getattr(usage, 'prompt_tokens', 0) or 0
+                self.completion_tokens += getattr(usage, 'completion_tokens', 0) or 0
+                hit, miss = prompt_cache_tokens(usage)
+                if hit is not None:
+                    self.prompt_cache_hit_tokens += hit
+                    self.prompt_cache_miss_tokens += miss
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'estimated_prompt_tokens': self.estimated_prompt_tokens,
+                # How far local pre-flight counts drift from what the provider billed
+                'estimate_ratio': self.estimated_prompt_tokens / self.prompt_tokens if self.prompt_tokens else None,
+                'output_budget_used': self.completion_tokens / self.output_budget_tokens if self.output_budget_tokens else None,
+                'prompt_cache_hit_tokens': self.prompt_cache_hit_tokens,
+                'prompt_cache_miss_tokens': self.prompt_cache_miss_tokens,
+                # Share of billed prompt tokens the provider served from its prefix cache
+                'prompt_cache_hit_rate': (self.prompt_cache_hit_tokens / (self.prompt_cache_hit_tokens + self.prompt_cache_miss_tokens)
+                                          if self.prompt_cache_hit_tokens + self.prompt_cache_miss_tokens else None)
+            }
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from sqlite_store import open_database
+
+
+def normalize_text(text):
+    # Unicode-normalize and collapse whitespace so trivial reformatting hits the same entry
+    text = unicodedata.normalize('NFKC', text)
+    return ' '.join(text.split())
+
+
+def make_cache_key(text, model, prompt_template, temperature):
+    """Content-address a verdict by normalized text and every request parameter that affects it"""
+    h = hashlib.sha256()
+    for part in (normalize_text(text), model, prompt_template, repr(float(temperature))):
+        data = part.encode('utf-8')
+        h.update(len(data).to_bytes(8, 'big'))
+        h.update(data)
+    return h.hexdigest()
+
+
+def make_variant_key(model, prompt_template, temperature):
+    """The request parameters of make_cache_key without the text, for stores that match texts by similarity"""
+    return make_cache_key('', model, prompt_template, temperature)
+
+
+class VerdictCache:
+    """Two-tier verdict cache: in-process LRU in front of a SQLite store"""
+
+    def __init__(self, path=None, max_memory_items=512, max_disk_items=50000, ttl=7 * 24 * 3600):
+        self.path = path or os.getenv('VERDICT_CACHE_PATH', os.path.join('.cache', 'verdicts.sqlite3'))
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.ttl = ttl
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+
+        self._db = open_database(self.path)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS verdicts (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._db.execute('CREATE INDEX IF NOT EXISTS verdicts_accessed_at ON verdicts (accessed_at)')
+        self._db.commit()
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return json.loads(entry[1])
+                del self._memory[key]
+
+            row = self._db.execute('SELECT value, stored_at FROM verdicts WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, stored_at = row
+            if self._expired(stored_at, now):
+                self._db.execute('DELETE FROM verdicts WHERE key = ?', (key,))
+                self._db.commit()
+                self.misses += 1
+                return None
+
+            self._db.execute('UPDATE verdicts SET accessed_at = ? WHERE key = ?', (now, key))
+            self._db.commit()
+            self._remember(key, stored_at, value)
+            self.hits += 1
+            return json.loads(value)
+
+    def set(self, key, analysis):
+        now = time.time()
+        value = json.dumps(analysis, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, now, value)
+            self._db.execute(
+                'INSERT OR REPLACE INTO verdicts (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, value, now, now)
+            )
+            self._evict_disk(now)
+            self._db.commit()
+
+    def _remember(self, key, stored_at, value):
+        # Values are kept serialized so callers can never mutate a cached verdict
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now):
+        if self.ttl is not None:
+            self._db.execute('DELETE FROM verdicts WHERE stored_at < ?', (now - self.ttl,))
+        if self.max_disk_items is not None:
+            (count,) = self._db.execute('SELECT COUNT(*) FROM verdicts').fetchone()
+            if count > self.max_disk_items:
+                self._db.execute(
+                    'DELETE FROM verdicts WHERE key IN (SELECT key FROM verdicts ORDER BY accessed_at LIMIT ?)',
+                    (count - self.max_disk_items,)
+                )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute('DELETE FROM verdicts')
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            (disk_items,) = self._db.execute('SELECT COUNT(*) FROM verdicts').fetchone()
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.hits - self.memory_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_items': len(self._memory),
+                'disk_items': disk_items
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()